@@ -1,7 +1,26 @@
 import re
 import json
+import hashlib
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+from src import class_page
+from src.class_page import extract_class_page
+
+# Extracted wine lists keyed by the SHA-256 of each class page, so only new or
+# changed master_class_N.html files are parsed again, and the page hash each
+# class's wines were last taken from.
+EXTRACTION_CACHE_PATH = Path(".master_class_wines_cache.json")
+# Hash of this script and the class page extractor: the cache is discarded
+# when the extraction code changes
+_fingerprint = hashlib.sha256()
+for _path in (__file__, class_page.__file__):
+    with open(os.path.abspath(_path), "rb") as _source:
+        _fingerprint.update(_source.read())
+PARSER_FINGERPRINT = _fingerprint.hexdigest()
+
 
 def parse_html_classes(html_content):
     """
@@ -92,29 +111,9 @@ def parse_html_classes(html_content):
 def extract_wines_from_class_html(html_content):
     """
     Extracts the list of wines from the HTML content of a single Master Class page.
-    Searches for lists following specific headings.
+    Tokenizes the page only up to the end of the list following the wine list heading.
     """
-    wines = []
-    wine_list_regex = re.compile(
-        r"(?:<p><strong>Maisteltavat samppanjat:</strong></p>|<p><strong>Champagnes:</strong></p>).*?<ul>(.*?)</ul>",
-        re.DOTALL | re.IGNORECASE,
-    )
-    list_item_regex = re.compile(r"<li.*?>(.*?)</li>", re.DOTALL | re.IGNORECASE)
-
-    match = wine_list_regex.search(html_content)
-    if match:
-        ul_content = match.group(1)
-        list_items = list_item_regex.findall(ul_content)
-        for item in list_items:
-            cleaned_wine = re.sub("<.*?>", "", item).strip()
-            # Additional cleaning for potential HTML entities like &amp;
-            cleaned_wine = cleaned_wine.replace("&amp;", "&").replace("&#8211;", "–")
-            if cleaned_wine:
-                wines.append(cleaned_wine)
-    # else: # Don't print error here, handled in the calling function
-    # print("Could not find the wine list section in the HTML.")
-
-    return wines
+    return extract_class_page(html_content).wines
 
 
 # --- Main Execution Logic ---
@@ -142,8 +141,7 @@ def run_initial_class_parsing():
             for master_class in parsed_data:
                 master_class["wines"] = []
 
-            with open(output_json_path, "w", encoding="utf-8") as f:
-                json.dump(parsed_data, f, ensure_ascii=False, indent=4)
+            write_json_atomic(output_json_path, parsed_data)
             print(
                 f"Successfully parsed {len(parsed_data)} classes from {html_file_path}."
             )
@@ -157,9 +155,79 @@ def run_initial_class_parsing():
         return False
 
 
+def write_json_atomic(path, data):
+    """Writes data as JSON to a temporary file next to path, then renames it into place."""
+    path = Path(path)
+    fd, tmp_path = tempfile.mkstemp(
+        dir=path.parent, prefix=f".{path.name}-", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=4)
+        os.chmod(tmp_path, 0o644)  # mkstemp creates owner-only files
+        os.replace(tmp_path, path)
+    except Exception:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def load_extraction_cache():
+    """
+    Reads the extraction cache file.
+
+    Returns:
+        tuple: ({content sha256: wines}, {html filename: content sha256 of the
+        page the class's wines were last taken from}). The wines are {} if the
+        file is missing or the extraction code changed; the page hashes are kept
+        across code changes.
+    """
+    try:
+        with open(EXTRACTION_CACHE_PATH, "r", encoding="utf-8") as f:
+            cache = json.load(f)
+    except FileNotFoundError:
+        return {}, {}
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable cache {EXTRACTION_CACHE_PATH}: {e}")
+        return {}, {}
+    if not isinstance(cache, dict):
+        return {}, {}
+    class_pages = cache.get("class_pages", {})
+    if cache.get("parser") != PARSER_FINGERPRINT:
+        return {}, class_pages
+    return cache.get("pages", {}), class_pages
+
+
+def extract_wines_in_parallel(html_by_hash):
+    """
+    Runs extract_wines_from_class_html on a process pool.
+
+    Returns:
+        dict: {content sha256: wines} for every page in html_by_hash.
+    """
+    if len(html_by_hash) <= 1:
+        # Not worth starting worker processes
+        return {
+            content_hash: extract_wines_from_class_html(html_content)
+            for content_hash, html_content in html_by_hash.items()
+        }
+    hashes = list(html_by_hash)
+    with ProcessPoolExecutor() as pool:
+        results = pool.map(
+            extract_wines_from_class_html,
+            [html_by_hash[content_hash] for content_hash in hashes],
+            chunksize=4,
+        )
+        return dict(zip(hashes, results))
+
+
 def populate_wines_from_html_files():
     """Reads master_classes.json, finds corresponding master_class_N.html files,
     extracts wines, and updates the JSON.
+    Pages are parsed in parallel and cached by content hash, so a corrected page
+    is re-extracted while unchanged pages are not parsed again.
     If an HTML file is missing, it prints a curl command to download it.
     """
     json_path = Path("master_classes.json")
@@ -179,9 +247,12 @@ def populate_wines_from_html_files():
         print(f"An unexpected error occurred reading {json_path}: {e}")
         return
 
-    updated_count = 0
     missing_files_commands = []  # Store commands for missing files
+    page_hashes = {}  # idx -> content hash of its HTML file
+    html_to_parse = {}  # content hash -> HTML, for pages not in the cache
+    cached_wines, class_pages = load_extraction_cache()
 
+    # --- Pass 1: hash every available page, collect the ones to parse --- #
     for idx, master_class in enumerate(master_classes_data):
         class_index = idx + 1  # 1-based index for filename
         html_filename = f"master_class_{class_index}.html"
@@ -191,27 +262,16 @@ def populate_wines_from_html_files():
         class_link = master_class.get("link")
 
         if html_file_path.is_file():
-            # Only update if the wines list is currently empty or missing
-            if not master_class.get("wines"):
-                print(f"  Processing {html_filename} for '{class_title}'...", end="")
-                try:
-                    with open(html_file_path, "r", encoding="utf-8") as f:
-                        html_content = f.read()
-                    extracted_wines = extract_wines_from_class_html(html_content)
-                    if extracted_wines:
-                        master_class["wines"] = extracted_wines
-                        updated_count += 1
-                        print(f" Found {len(extracted_wines)} wines.")
-                    else:
-                        master_class["wines"] = (
-                            []
-                        )  # Ensure key exists even if no wines found
-                        print(" No wine list found in file.")
-                except Exception as e:
-                    print(f" Error processing {html_filename}: {e}")
-                    master_class["wines"] = []  # Ensure key exists on error
-            # else: # Optional: Add message if already populated
-            # print(f"  Skipping {html_filename} for '{class_title}', already has wines.")
+            try:
+                raw_html = html_file_path.read_bytes()
+                content_hash = hashlib.sha256(raw_html).hexdigest()
+                if content_hash not in cached_wines:
+                    html_to_parse[content_hash] = raw_html.decode("utf-8")
+            except (OSError, UnicodeDecodeError) as e:
+                print(f"  Error reading {html_filename}: {e}")
+                master_class.setdefault("wines", [])  # Ensure key exists on error
+                continue
+            page_hashes[idx] = content_hash
         else:
             # Ensure 'wines' key exists if file is missing
             if "wines" not in master_class:
@@ -227,15 +287,64 @@ def populate_wines_from_html_files():
             # else: # No link, can't download
             # print(f"  Missing file: {html_filename} for '{class_title}' (No link available)")
 
+    # --- Pass 2: parse new/changed pages in parallel --- #
+    print(
+        f"  {len(page_hashes)} class pages found, {len(html_to_parse)} new or changed."
+    )
+    try:
+        parsed_wines = extract_wines_in_parallel(html_to_parse)
+    except Exception as e:
+        print(f"  Error extracting wines: {e}")
+        return
+    cached_wines.update(parsed_wines)
+
+    # --- Pass 3: merge the results into the class list --- #
+    updated_count = 0
+    for idx, content_hash in page_hashes.items():
+        master_class = master_classes_data[idx]
+        html_filename = f"master_class_{idx + 1}.html"
+        extracted_wines = cached_wines[content_hash]
+        if content_hash in parsed_wines:
+            print(
+                f"  Processed {html_filename} for '{master_class.get('title', f'Class {idx + 1}')}':"
+                + (
+                    f" Found {len(extracted_wines)} wines."
+                    if extracted_wines
+                    else " No wine list found in file."
+                )
+            )
+        # An empty extraction only replaces stored wines when the page itself
+        # changed, so wines filled in earlier are not wiped
+        previous_hash = class_pages.get(html_filename)
+        page_changed = previous_hash is not None and previous_hash != content_hash
+        if (extracted_wines or page_changed) and master_class.get("wines") != extracted_wines:
+            master_class["wines"] = list(extracted_wines)
+            updated_count += 1
+        master_class.setdefault("wines", [])
+        class_pages[html_filename] = content_hash
+
     # Save the updated data back to JSON (reflects processed files)
     try:
-        with open(json_path, "w", encoding="utf-8") as f:
-            json.dump(master_classes_data, f, ensure_ascii=False, indent=4)
+        write_json_atomic(json_path, master_classes_data)
         print(f"\nFinished processing. Updated {updated_count} classes with wines.")
         print(f"Updated data saved to {json_path}")
     except Exception as e:
         print(f"An error occurred saving updated data to {json_path}: {e}")
 
+    # Only keep entries for pages that still exist
+    live_hashes = set(page_hashes.values())
+    try:
+        write_json_atomic(
+            EXTRACTION_CACHE_PATH,
+            {
+                "parser": PARSER_FINGERPRINT,
+                "pages": {h: w for h, w in cached_wines.items() if h in live_hashes},
+                "class_pages": class_pages,
+            },
+        )
+    except Exception as e:
+        print(f"Warning: Could not write {EXTRACTION_CACHE_PATH}: {e}")
+
     # Print commands for missing files at the end
     if missing_files_commands:
         print(
@@ -1,15 +1,39 @@
 import os
 import sys
 import json
+import hashlib
 import re
+import threading
+import time
+
+# Taken before the heavy imports, for the startup timings in /api/status
+_IMPORT_STARTED = time.perf_counter()
+
+from types import MappingProxyType
 from flask import Flask, jsonify, render_template, request
+from werkzeug.datastructures import MultiDict
 from datetime import datetime, timedelta
 
 # Ensure the src directory is in the Python path
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, project_root)
 
-from src.core_logic import load_all_data, find_next_rare_opening
+from src.core_logic import (
+    DEFAULT_RESULT_LIMIT,
+    DEFAULT_VISIT_MINUTES,
+    RESULT_ORDERS,
+    load_all_data,
+    find_next_rare_opening,
+    find_next_rare_openings_batch,
+    next_opening_boundary,
+    next_reachability_change,
+    normalize_cache_stats,
+    normalize_names,
+    plan_itinerary,
+    source_signatures,
+)
+from src.response_cache import ExpiringLRUCache
+from src.snapshot import file_signature
 
 # --- Flask App Initialization ---
 app = Flask(__name__)
@@ -26,150 +50,399 @@ MC_DURATION_MINUTES = 60  # Assume 1 hour duration
 # ----------------------------------
 
 # --- Global Data Store ---
-# Load data once when the app starts
-ALL_DATA = None
-LAST_LOAD_TIME = None
-DATA_LOAD_ERROR = None
-MASTER_CLASSES_DATA = None
+# Requests read DATA_BUNDLE once and use only that object. The refresher thread
+# builds a complete replacement bundle off the request path and publishes it
+# with a single reference assignment, so readers never see a half-loaded state.
+DATA_BUNDLE = None
+# How often the refresher checks input files for changes (mtime and size)
+DATA_POLL_INTERVAL_SECONDS = 5
+MATERIAL_DIR = os.path.join(project_root, "Material")
+MASTER_CLASSES_PATH = os.path.join(app.static_folder, "master_classes.json")
+_bundle_lock = threading.Lock()  # Serializes builds, never taken by readers
+_background_threads = []
+_background_pid = None  # Process the background threads were started in
+_background_lock = threading.Lock()
+_failed_signatures = None  # Inputs that last failed to load; not retried until they change
+_bundle_version = 0  # Incremented for every published bundle
+
+# --- Recommendation Response Cache ---
+# Most phones poll with the same few preference combinations, so responses are
+# cached per (data version, preferences, limit, order, next opening time). An entry expires
+# exactly when that opening starts, since only then can the result change.
+RESPONSE_CACHE_MAX_ENTRIES = 1024
+RECOMMENDATION_CACHE = ExpiringLRUCache(RESPONSE_CACHE_MAX_ENTRIES)
+MAX_BATCH_PROFILES = 200  # Upper bound for /api/next-opening/batch
+MAX_RESULT_LIMIT = 100  # Upper bound for the 'limit' query parameter
+MAX_VISIT_MINUTES = 240  # Upper bound for the itinerary 'visit_minutes' parameter
+
+
+def load_master_classes(master_classes_path):
+    """Loads master_classes.json and adds start/end datetimes to each class."""
+    if not os.path.exists(master_classes_path):
+        print(f"WARNING: {master_classes_path} not found in static folder.")
+        return []
+
+    with open(master_classes_path, "r", encoding="utf-8") as f:
+        raw_mc_data = json.load(f)
+
+    processed_mc_data = []
+    for mc in raw_mc_data:
+        try:
+            raw_day_string = mc.get("day", "")
+            time_str = mc.get("time", "")
 
+            # Extract only the first word (day name) and uppercase it
+            day_name_match = re.match(r"^(\w+)", raw_day_string)
+            day_name_upper = day_name_match.group(1).upper() if day_name_match else ""
 
-def load_data_if_needed():
-    """Loads data from files if not already loaded or if outdated."""
-    global ALL_DATA, LAST_LOAD_TIME, DATA_LOAD_ERROR, MASTER_CLASSES_DATA
-    now = datetime.now()
-    # Reload data if older than, say, 1 hour (adjust as needed)
-    # Or if it hasn't been loaded yet
-    if ALL_DATA is None or (now - LAST_LOAD_TIME).total_seconds() > 3600:
-        print(f"[{now}] Loading/Reloading data...")
-        try:
-            material_dir = os.path.join(project_root, "Material")
-            ALL_DATA = load_all_data(material_dir)
-
-            # Load and Pre-process master class data
-            master_classes_path = os.path.join(app.static_folder, "master_classes.json")
-            if os.path.exists(master_classes_path):
-                with open(master_classes_path, "r", encoding="utf-8") as f:
-                    raw_mc_data = json.load(f)
-
-                processed_mc_data = []
-                for mc in raw_mc_data:
-                    try:
-                        raw_day_string = mc.get("day", "")
-                        time_str = mc.get("time", "")
-
-                        # Extract only the first word (day name) and uppercase it
-                        day_name_match = re.match(r"^(\w+)", raw_day_string)
-                        day_name_upper = (
-                            day_name_match.group(1).upper() if day_name_match else ""
-                        )
-
-                        date_str = EVENT_DATES.get(day_name_upper)
-
-                        if date_str and time_str:
-                            # Combine date and time, assuming HH:MM format for time
-                            start_dt_str = f"{date_str} {time_str}"
-                            mc["start_datetime"] = datetime.strptime(
-                                start_dt_str, "%Y-%m-%d %H:%M"
-                            )
-                            mc["end_datetime"] = mc["start_datetime"] + timedelta(
-                                minutes=MC_DURATION_MINUTES
-                            )
-                        else:
-                            mc["start_datetime"] = None
-                            mc["end_datetime"] = None
-                            print(
-                                f"Warning: Could not parse datetime for MC: {mc.get('title')} (Raw Day: '{raw_day_string}', Time: '{time_str}')",
-                                file=sys.stderr,
-                            )
-                        processed_mc_data.append(mc)
-                    except ValueError as ve:
-                        print(
-                            f"Warning: Invalid datetime format for MC: {mc.get('title')} (Raw Day: '{raw_day_string}', Time: '{time_str}'). Error: {ve}",
-                            file=sys.stderr,
-                        )
-                        mc["start_datetime"] = None
-                        mc["end_datetime"] = None
-                        processed_mc_data.append(mc)  # Still append, but without times
-                    except (
-                        Exception
-                    ) as inner_e:  # Catch other potential errors during MC processing
-                        print(
-                            f"Error processing MC item {mc.get('title')}: {inner_e}",
-                            file=sys.stderr,
-                        )
-                        mc["start_datetime"] = None
-                        mc["end_datetime"] = None
-                        processed_mc_data.append(mc)
-
-                MASTER_CLASSES_DATA = processed_mc_data
-                print(
-                    f"[{now}] Loaded and processed {len(MASTER_CLASSES_DATA)} master classes."
+            date_str = EVENT_DATES.get(day_name_upper)
+
+            if date_str and time_str:
+                # Combine date and time, assuming HH:MM format for time
+                start_dt_str = f"{date_str} {time_str}"
+                mc["start_datetime"] = datetime.strptime(start_dt_str, "%Y-%m-%d %H:%M")
+                mc["end_datetime"] = mc["start_datetime"] + timedelta(
+                    minutes=MC_DURATION_MINUTES
                 )
             else:
-                MASTER_CLASSES_DATA = []
+                mc["start_datetime"] = None
+                mc["end_datetime"] = None
                 print(
-                    f"[{now}] WARNING: master_classes.json not found in static folder."
+                    f"Warning: Could not parse datetime for MC: {mc.get('title')} (Raw Day: '{raw_day_string}', Time: '{time_str}')",
+                    file=sys.stderr,
                 )
+            processed_mc_data.append(mc)
+        except ValueError as ve:
+            print(
+                f"Warning: Invalid datetime format for MC: {mc.get('title')} (Raw Day: '{raw_day_string}', Time: '{time_str}'). Error: {ve}",
+                file=sys.stderr,
+            )
+            mc["start_datetime"] = None
+            mc["end_datetime"] = None
+            processed_mc_data.append(mc)  # Still append, but without times
+        except Exception as inner_e:  # Catch other potential errors during MC processing
+            print(
+                f"Error processing MC item {mc.get('title')}: {inner_e}",
+                file=sys.stderr,
+            )
+            mc["start_datetime"] = None
+            mc["end_datetime"] = None
+            processed_mc_data.append(mc)
+
+    return processed_mc_data
+
+
+def build_master_class_index(master_classes):
+    """
+    Maps each class identifier (its link, or 'presenter-title' without one) to
+    its precomputed time slot and normalized wine set.
+    """
+    master_class_index = {}
+    for mc in master_classes:
+        identifier = mc.get("link") or f"{mc.get('presenter')}-{mc.get('title')}"
+        if identifier in master_class_index:
+            continue  # Keep the first class with this identifier, as before
+        slot = None
+        if mc.get("start_datetime") and mc.get("end_datetime"):
+            slot = (mc["start_datetime"], mc["end_datetime"])
+        master_class_index[identifier] = {
+            "slot": slot,
+            "normalized_wines": frozenset(normalize_names(mc.get("wines") or [])),
+        }
+    return master_class_index
+
+
+def input_signatures():
+    """Change-detection signatures for every input file, keyed by source."""
+    signatures = source_signatures(MATERIAL_DIR)
+    signatures["master_classes"] = file_signature(MASTER_CLASSES_PATH)
+    return signatures
+
+
+def build_data_bundle(previous=None, changed_sources=None, signatures=None):
+    """
+    Loads data into a new, read-only bundle. Raises on failure.
+
+    With a previous bundle and a set of changed source keys, only those
+    sources are re-read; everything else is shared with the previous bundle.
+    `signatures` are the input signatures taken before the load (read here if
+    not given) and are stored in the bundle.
+    """
+    global _bundle_version
+    now = datetime.now()
+    # Taken before reading, so an edit made during the load is seen next poll
+    if signatures is None:
+        signatures = input_signatures()
+
+    # PDFs are parsed sequentially in the server: no worker processes are
+    # started from a gunicorn worker (`python -m src.snapshot` parses in parallel)
+    if previous is None:
+        all_data = load_all_data(MATERIAL_DIR, pdf_workers=1)
+    elif changed_sources - {"master_classes"}:
+        all_data = load_all_data(
+            MATERIAL_DIR,
+            previous=previous["all_data"],
+            changed_sources=changed_sources,
+            pdf_workers=1,
+        )
+    else:
+        all_data = previous["all_data"]
+    # An empty schedule or wine list (e.g. a PDF caught mid-replace) is a failed
+    # load, so refresh_data_bundle keeps serving the previous bundle
+    for key in ("rare_schedule", "wine_details"):
+        if not all_data[key]:
+            raise ValueError(f"Loaded data has no {key.replace('_', ' ')}")
+
+    if previous is None or "master_classes" in changed_sources:
+        master_classes = load_master_classes(MASTER_CLASSES_PATH)
+        master_class_index = build_master_class_index(master_classes)
+        print(f"[{now}] Loaded and processed {len(master_classes)} master classes.")
+    else:
+        master_classes = previous["master_classes"]
+        master_class_index = previous["master_class_index"]
+
+    _bundle_version += 1
+    return MappingProxyType(
+        {
+            "version": _bundle_version,
+            "all_data": all_data,
+            "master_classes": master_classes,
+            "master_class_index": master_class_index,
+            "loaded_at": now,
+            "signatures": signatures,
+            "error": None,
+        }
+    )
 
-            LAST_LOAD_TIME = now
-            DATA_LOAD_ERROR = None
+
+def refresh_data_bundle():
+    """
+    Reloads whichever inputs changed since the current bundle was built and
+    swaps in the result. Keeps serving the last good bundle on failure.
+    """
+    global DATA_BUNDLE, _failed_signatures
+    with _bundle_lock:
+        current = DATA_BUNDLE
+        previous = current if current is not None and current["all_data"] else None
+        changed_sources = None
+        # Taken before loading, and recorded as failed if the load fails: a
+        # file completed during a failed load has a newer signature, so it is
+        # retried on the next poll
+        signatures = input_signatures()
+        if previous is not None:
+            if signatures == _failed_signatures:
+                return
+            changed_sources = {
+                key
+                for key, signature in signatures.items()
+                if previous["signatures"].get(key) != signature
+            }
+            if not changed_sources:
+                return
+        elif current is not None and signatures == _failed_signatures:
+            return
+
+        now = datetime.now()
+        if changed_sources:
+            print(f"[{now}] Reloading changed data sources: {sorted(changed_sources)}")
+        else:
+            print(f"[{now}] Loading data...")
+        try:
+            DATA_BUNDLE = build_data_bundle(previous, changed_sources, signatures)
+            RECOMMENDATION_CACHE.clear()  # Entries of older versions can never hit again
+            _failed_signatures = None
             print(f"[{now}] Main data loaded successfully.")
+            notify_recommendation_change()
         except Exception as e:
-            ALL_DATA = None
-            MASTER_CLASSES_DATA = None
-            DATA_LOAD_ERROR = f"Failed to load data: {e}"
             print(f"[{now}] ERROR loading data: {e}", file=sys.stderr)
+            _failed_signatures = signatures
+            if previous is not None:
+                print(f"[{now}] Continuing to serve data loaded at {previous['loaded_at']}.")
+                return
+            DATA_BUNDLE = MappingProxyType(
+                {
+                    "version": None,
+                    "all_data": None,
+                    "master_classes": None,
+                    "master_class_index": None,
+                    "loaded_at": now,
+                    "signatures": {},
+                    "error": f"Failed to load data: {e}",
+                }
+            )
 
 
-# Initial data load on startup
+def current_event_time():
+    """Current time at the event, as the naive local (EEST) time the schedule uses."""
+    # Server's naive time is UTC; add 3 hours to approximate EEST (UTC+3)
+    return datetime.now() + timedelta(hours=3)
+
+
+# --- Recommendation Change Notifications ---
+# Results change only when a scheduled opening starts or the data is reloaded.
+# A single scheduler thread sleeps until the next opening and then wakes every
+# waiting SSE stream, instead of each connected phone running its own timer.
+# Each open stream holds a worker thread, so pushed updates are opt-in
+# (STREAM_UPDATES=1) for servers with a threaded worker class such as gunicorn
+# gthread; by default the page polls /api/next-opening instead.
+STREAM_UPDATES_ENABLED = os.environ.get("STREAM_UPDATES") == "1"
+STREAM_KEEPALIVE_SECONDS = 25
+SCHEDULER_MAX_SLEEP_SECONDS = 300  # Re-check periodically in case the clock jumps
+_change_condition = threading.Condition()
+_change_generation = 0
+
+
+def notify_recommendation_change():
+    """Wakes every stream so it recomputes (and pushes, if different) its results."""
+    global _change_generation
+    with _change_condition:
+        _change_generation += 1
+        _change_condition.notify_all()
+
+
+def wait_for_recommendation_change(seen_generation, timeout):
+    """
+    Blocks until the change generation differs from seen_generation (None
+    returns immediately). Returns the new generation, or None on timeout.
+    """
+    with _change_condition:
+        if seen_generation is not None:
+            _change_condition.wait_for(
+                lambda: _change_generation != seen_generation, timeout
+            )
+            if _change_generation == seen_generation:
+                return None
+        return _change_generation
+
+
+def _wake_at_schedule_boundaries():
+    """Scheduler thread body: notifies streams whenever the next opening starts."""
+    while True:
+        bundle = DATA_BUNDLE
+        now = current_event_time()
+        boundary = None
+        if bundle is not None and bundle["all_data"]:
+            boundary = next_opening_boundary(bundle["all_data"]["opening_index"], now)
+        sleep_seconds = SCHEDULER_MAX_SLEEP_SECONDS
+        if boundary is not None:
+            sleep_seconds = min(sleep_seconds, (boundary - now).total_seconds())
+
+        with _change_condition:
+            generation = _change_generation
+            # A reload notification also ends the wait, so the boundary is recomputed
+            _change_condition.wait_for(
+                lambda: _change_generation != generation, max(sleep_seconds, 0)
+            )
+            reloaded = _change_generation != generation
+        if not reloaded and boundary is not None and current_event_time() >= boundary:
+            notify_recommendation_change()
+
+
+def _refresh_periodically():
+    """Refresher thread body: polls the input files and reloads what changed."""
+    while True:
+        time.sleep(DATA_POLL_INTERVAL_SECONDS)
+        refresh_data_bundle()
+
+
+def _ensure_background_threads():
+    """Starts the refresher and scheduler threads once per process (also after a gunicorn fork)."""
+    global _background_threads, _background_pid
+    if _background_pid == os.getpid():
+        return
+    with _background_lock:
+        if _background_pid == os.getpid():
+            return
+        _background_threads = [
+            threading.Thread(target=target, name=name, daemon=True)
+            for name, target in (
+                ("data-refresher", _refresh_periodically),
+                ("schedule-waker", _wake_at_schedule_boundaries),
+            )
+        ]
+        for thread in _background_threads:
+            thread.start()
+        _background_pid = os.getpid()
+
+
+def load_data_if_needed():
+    """Returns the current data bundle, loading it synchronously only on first use."""
+    if DATA_BUNDLE is None:
+        refresh_data_bundle()
+    return DATA_BUNDLE
+
+
+# Initial data load on startup. The background threads are not started here:
+# under a preloading server (gunicorn --preload) this runs in the master, whose
+# threads the forked workers would not have, so each worker starts its own on
+# its first request.
 load_data_if_needed()
 
 
+@app.before_request
+def start_background_threads():
+    _ensure_background_threads()
+
+# Seconds from the start of this module's import to the end of the initial
+# data load, and to the first response sent (see src/startup_report.py)
+STARTUP_TIMINGS = {
+    "import_seconds": round(time.perf_counter() - _IMPORT_STARTED, 3),
+    "first_request_seconds": None,
+}
+print(f"Startup: app imported and data loaded in {STARTUP_TIMINGS['import_seconds']:.3f} s")
+
+
+@app.after_request
+def record_first_request(response):
+    if STARTUP_TIMINGS["first_request_seconds"] is None:
+        STARTUP_TIMINGS["first_request_seconds"] = round(
+            time.perf_counter() - _IMPORT_STARTED, 3
+        )
+        print(
+            f"Startup: first request served {STARTUP_TIMINGS['first_request_seconds']:.3f} s after import began"
+        )
+    return response
+
+
 # --- Frontend Route ---
 @app.route("/")
 def index():
     """Serves the main HTML page."""
     # Ensure data is loaded for house list
-    load_data_if_needed()
+    bundle = load_data_if_needed()
+    all_data = bundle["all_data"]
     house_list = []
-    if ALL_DATA and "house_names" in ALL_DATA:
-        house_list = sorted(list(ALL_DATA["house_names"]))  # Pass sorted list
+    if all_data and "house_names" in all_data:
+        house_list = sorted(list(all_data["house_names"]))  # Pass sorted list
 
     # Pass error status too, so template can show message if data failed
-    data_load_error = DATA_LOAD_ERROR
+    data_load_error = bundle["error"]
 
     return render_template(
-        "index.html", houses=house_list, data_load_error=data_load_error
+        "index.html",
+        houses=house_list,
+        data_load_error=data_load_error,
+        stream_updates=STREAM_UPDATES_ENABLED,
     )
 
 
 # --- API Endpoints ---
-@app.route("/api/next-opening", methods=["GET"])
-def get_next_opening():
-    """API endpoint to get the next highly recommended rare opening(s)."""
-    load_data_if_needed()
-
-    if DATA_LOAD_ERROR:
-        return (
-            jsonify({"error": "Data loading failed", "details": DATA_LOAD_ERROR}),
-            500,
-        )
-    if not ALL_DATA:
-        return jsonify({"error": "Data not loaded"}), 500
-    if MASTER_CLASSES_DATA is None:
-        print(
-            "Warning: Master class data not loaded, cannot exclude wines from attended classes."
-        )
-
-    # --- Parse Preferences from Query Parameters --- #
+def parse_recommendation_preferences(args, master_class_index):
+    """
+    Turns /api/next-opening query parameters into core-logic preferences.
+
+    Returns:
+        tuple: (dynamic_preferences dict, hashable key of those preferences).
+    Raises:
+        ValueError: If older_than_year is not an integer.
+    """
     dynamic_preferences = {}
-    excluded_wines = set()
 
-    pref_houses = request.args.getlist("house")
+    pref_houses = args.getlist("house")
     if pref_houses:
         dynamic_preferences["houses"] = pref_houses
 
-    pref_size = request.args.get("size")
+    pref_size = args.get("size")
     if pref_size and pref_size != "any":
         if pref_size == "magnum":
             dynamic_preferences["sizes"] = [
@@ -182,126 +455,550 @@ def get_next_opening():
         # else:
         #    dynamic_preferences['sizes'] = [pref_size]
 
-    pref_older_than = request.args.get("older_than_year")
+    pref_older_than = args.get("older_than_year")
     if pref_older_than:
-        try:
-            dynamic_preferences["older_than_year"] = int(pref_older_than)
-        except ValueError:
-            return (
-                jsonify({"error": "Invalid year format for older_than parameter."}),
-                400,
-            )
+        dynamic_preferences["older_than_year"] = int(pref_older_than)
 
     # --- Check for ignore_tasted flag --- #
-    ignore_tasted_flag = request.args.get("ignore_tasted", "false").lower() == "true"
+    ignore_tasted_flag = args.get("ignore_tasted", "false").lower() == "true"
     if ignore_tasted_flag:
         dynamic_preferences["ignore_tasted"] = True
     # ---------------------------------- #
 
     # --- Get wines and time slots from attended Master Classes --- #
-    attended_mc_ids = request.args.getlist("attended_mc_id")
+    attended_mc_ids = args.getlist("attended_mc_id")
     attended_mc_slots = []
-    excluded_wines_from_mc = set()  # Renamed to be specific
+    excluded_wines_from_mc = set()  # Normalized names, precomputed per class
 
-    if attended_mc_ids and MASTER_CLASSES_DATA:
+    if attended_mc_ids and master_class_index:
         for mc_id in attended_mc_ids:
-            found_mc = None
-            for mc in MASTER_CLASSES_DATA:
-                # Use the pre-processed data
-                identifier = (
-                    mc.get("link") or f"{mc.get('presenter')}-{mc.get('title')}"
-                )
-                if identifier == mc_id:
-                    found_mc = mc
-                    break
-            if found_mc:
+            entry = master_class_index.get(mc_id)
+            if entry:
                 # Collect the slot if datetimes are valid
-                if found_mc.get("start_datetime") and found_mc.get("end_datetime"):
-                    attended_mc_slots.append(
-                        {
-                            "start": found_mc["start_datetime"],
-                            "end": found_mc["end_datetime"],
-                        }
-                    )
+                if entry["slot"]:
+                    attended_mc_slots.append(entry["slot"])
                 # Collect wines to potentially exclude (based on flag later)
-                if found_mc.get("wines"):
-                    excluded_wines_from_mc.update(found_mc["wines"])
+                excluded_wines_from_mc.update(entry["normalized_wines"])
 
-    # Add collected data to dynamic preferences
     # Conditionally add MC wines to exclusion list
+    # (not excluded when ignore_tasted is True)
     if excluded_wines_from_mc and not ignore_tasted_flag:
-        dynamic_preferences["excluded_wines"] = list(excluded_wines_from_mc)
-        # print(f"DEBUG: Excluding MC wines because ignore_tasted is False: {excluded_wines_from_mc}")
-    elif excluded_wines_from_mc:
-        # Ensure the key exists but is empty if ignore_tasted is True, so core_logic doesn't mix things up
-        # If the flag is true, we still collected them, but we don't pass them for exclusion.
-        # dynamic_preferences["excluded_wines"] = [] # This line might be redundant if core_logic handles absence okay
-        pass  # Don't add MC wines to exclusion list if ignore_tasted is True
-        # print(f"DEBUG: NOT excluding MC wines because ignore_tasted is True: {excluded_wines_from_mc}")
+        dynamic_preferences["excluded_normalized_wines"] = excluded_wines_from_mc
 
     if attended_mc_slots:
         dynamic_preferences["attended_mc_slots"] = attended_mc_slots
     # ---------------------------------------------------------- #
 
-    # --- Determine Current Time (Allow Override for Testing) --- #
-    custom_time_str = request.args.get("custom_time")
+    # Stand the user is at now; openings they cannot walk to in time are dropped
+    current_stand = args.get("current_stand") or None
+    if current_stand:
+        dynamic_preferences["current_stand"] = current_stand
+
+    preferences_key = (
+        tuple(sorted(set(pref_houses))),
+        tuple(dynamic_preferences.get("sizes", ())),
+        dynamic_preferences.get("older_than_year"),
+        ignore_tasted_flag,
+        tuple(sorted(set(attended_mc_ids))),
+        current_stand,
+    )
+    return dynamic_preferences, preferences_key
+
+
+def parse_result_options(args):
+    """
+    Reads the result count ('limit') and ordering ('sort') query parameters.
+
+    Returns:
+        tuple: (limit, order); DEFAULT_RESULT_LIMIT and "time" when absent.
+    Raises:
+        ValueError: With a user-facing message if either value is invalid.
+    """
+    limit_arg = args.get("limit")
+    try:
+        limit = int(limit_arg) if limit_arg else DEFAULT_RESULT_LIMIT
+    except ValueError:
+        raise ValueError("Invalid format for limit parameter.")
+    if not 1 <= limit <= MAX_RESULT_LIMIT:
+        raise ValueError(f"limit must be between 1 and {MAX_RESULT_LIMIT}.")
+
+    order = args.get("sort") or "time"
+    if order not in RESULT_ORDERS:
+        raise ValueError(f"sort must be one of: {', '.join(RESULT_ORDERS)}.")
+    return limit, order
+
+
+def get_recommendations(
+    bundle,
+    current_time,
+    dynamic_preferences,
+    preferences_key,
+    limit=DEFAULT_RESULT_LIMIT,
+    order="time",
+):
+    """
+    Returns (payload, etag) for the given preferences, from the response cache
+    when possible. Identical requests within the same gap between two
+    scheduled openings share one entry.
+    """
+    all_data = bundle["all_data"]
+    next_boundary = next_opening_boundary(all_data["opening_index"], current_time)
+    cache_key = (bundle["version"], preferences_key, limit, order, next_boundary)
+    cached = RECOMMENDATION_CACHE.get(cache_key, current_time)
+    if cached is None:
+        response_data = build_recommendations_response(
+            all_data, current_time, dynamic_preferences, limit, order
+        )
+        cached = (response_data, recommendations_etag(bundle["version"], response_data))
+        RECOMMENDATION_CACHE.put(
+            cache_key,
+            cached,
+            expires_at=results_expiry(
+                all_data, current_time, dynamic_preferences, next_boundary
+            ),
+        )
+    return cached
+
+
+def results_expiry(all_data, current_time, dynamic_preferences, next_boundary):
+    """
+    Moment until which results for these preferences stay valid: the next
+    opening start, or earlier when an opening stops being reachable on foot
+    from the current stand.
+    """
+    current_stand = (dynamic_preferences or {}).get("current_stand")
+    if not current_stand:
+        return next_boundary
+    reachability_change = next_reachability_change(
+        all_data["opening_index"], current_time, current_stand
+    )
+    if reachability_change is None or next_boundary is None:
+        return reachability_change or next_boundary
+    return min(reachability_change, next_boundary)
 
-    # Get server's naive time (which we know is UTC)
-    current_time_naive_utc = datetime.now()
 
-    # --- ADJUSTMENT FOR EASIEST FIX ---
-    # Add 3 hours to approximate EEST (since event is during EEST/UTC+3)
-    current_time_approx_eest = current_time_naive_utc + timedelta(hours=3)
-    current_time = current_time_approx_eest  # Pass this approximated EEST time
-    # ----------------------------------
+@app.route("/api/next-opening", methods=["GET"])
+def get_next_opening():
+    """API endpoint to get the next highly recommended rare opening(s)."""
+    # Take one reference to the bundle so a concurrent reload cannot tear this request
+    bundle = load_data_if_needed()
+    all_data = bundle["all_data"]
+
+    if bundle["error"]:
+        return (
+            jsonify({"error": "Data loading failed", "details": bundle["error"]}),
+            500,
+        )
+    if not all_data:
+        return jsonify({"error": "Data not loaded"}), 500
+    if bundle["master_classes"] is None:
+        print(
+            "Warning: Master class data not loaded, cannot exclude wines from attended classes."
+        )
 
-    # --- Update Logging (Optional but Recommended) ---
+    # --- Parse Preferences from Query Parameters --- #
+    try:
+        dynamic_preferences, preferences_key = parse_recommendation_preferences(
+            request.args, bundle["master_class_index"]
+        )
+    except ValueError:
+        return (
+            jsonify({"error": "Invalid year format for older_than parameter."}),
+            400,
+        )
+    try:
+        limit, order = parse_result_options(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # --- Determine Current Time --- #
+    current_time = current_event_time()
     print(
-        f"LOG_APP: Request received. Server Naive Time (UTC): {current_time_naive_utc.isoformat()}",
+        f"LOG_APP: Request received. Approximated Naive EEST passed to core: {current_time.isoformat()}",
         file=sys.stderr,
     )
-    print(
-        f"LOG_APP: Approximated Naive EEST passed to core: {current_time.isoformat()}",
-        file=sys.stderr,
+
+    response_data, etag = get_recommendations(
+        bundle, current_time, dynamic_preferences, preferences_key, limit, order
+    )
+
+    # --- Conditional GET: unchanged results cost an empty 304 --- #
+    # If-None-Match uses weak comparison, so a W/ tag (e.g. after a compressing
+    # proxy) still matches
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+    else:
+        response = jsonify(response_data)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"  # Always revalidate, never reuse blindly
+    return response
+
+
+@app.route("/api/next-opening/stream", methods=["GET"])
+def stream_next_opening():
+    """
+    Server-Sent Events stream of /api/next-opening results for the given
+    preferences. A new 'recommendations' event (id = ETag) is pushed only
+    when the result changes: after a scheduled opening starts or the data
+    is reloaded. One scheduler thread wakes all streams at those moments.
+    Only served when STREAM_UPDATES_ENABLED.
+    """
+    if not STREAM_UPDATES_ENABLED:
+        return jsonify({"error": "Streaming updates are not enabled."}), 404
+    bundle = load_data_if_needed()
+    try:
+        parse_recommendation_preferences(request.args, bundle["master_class_index"])
+    except ValueError:
+        return (
+            jsonify({"error": "Invalid year format for older_than parameter."}),
+            400,
+        )
+    try:
+        limit, order = parse_result_options(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    args = request.args.copy()
+    # Reachability from the current stand changes between openings, so such
+    # streams also re-check on every keepalive tick
+    recheck_on_keepalive = bool(args.get("current_stand"))
+    # EventSource resends the last id on reconnect, so nothing is pushed twice
+    last_sent_etag = request.headers.get("Last-Event-ID")
+
+    def generate():
+        sent_etag = last_sent_etag
+        generation = None
+        while True:
+            generation = wait_for_recommendation_change(
+                generation, STREAM_KEEPALIVE_SECONDS
+            )
+            if generation is None:
+                yield ": keepalive\n\n"  # Keeps proxies from closing an idle stream
+                if not recheck_on_keepalive:
+                    continue
+
+            current_bundle = DATA_BUNDLE
+            if not current_bundle["all_data"]:
+                error = {"error": "Data loading failed", "details": current_bundle["error"]}
+                yield f"event: data-error\ndata: {json.dumps(error)}\n\n"
+                continue
+            # Re-parse against the current bundle: MC data may have been reloaded
+            dynamic_preferences, preferences_key = parse_recommendation_preferences(
+                args, current_bundle["master_class_index"]
+            )
+            response_data, etag = get_recommendations(
+                current_bundle,
+                current_event_time(),
+                dynamic_preferences,
+                preferences_key,
+                limit,
+                order,
+            )
+            if etag != sent_etag:
+                sent_etag = etag
+                yield (
+                    f"event: recommendations\nid: {etag}\n"
+                    f"data: {json.dumps(response_data, ensure_ascii=False)}\n\n"
+                )
+
+    response = app.response_class(generate(), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"  # Disable proxy buffering (nginx)
+    return response
+
+
+@app.route("/api/next-opening/batch", methods=["POST"])
+def get_next_opening_batch():
+    """
+    API endpoint computing /api/next-opening results for many preference
+    profiles in one call. Body: {"profiles": [{"id": ..., "house": [...],
+    "size": "magnum", "older_than_year": 2000, "ignore_tasted": false,
+    "attended_mc_id": [...]}, ...]}, using the same names as the query
+    parameters of /api/next-opening (including "limit" and "sort").
+    """
+    bundle = load_data_if_needed()
+    if bundle["error"] or not bundle["all_data"]:
+        return (
+            jsonify({"error": "Data loading failed", "details": bundle["error"]}),
+            500,
+        )
+
+    body = request.get_json(silent=True)
+    profiles = body.get("profiles") if isinstance(body, dict) else None
+    if not isinstance(profiles, list) or not all(isinstance(p, dict) for p in profiles):
+        return jsonify({"error": "Expected a JSON body with a 'profiles' list."}), 400
+    if len(profiles) > MAX_BATCH_PROFILES:
+        return (
+            jsonify({"error": f"At most {MAX_BATCH_PROFILES} profiles per request."}),
+            400,
+        )
+
+    current_time = current_event_time()
+    next_boundary = next_opening_boundary(
+        bundle["all_data"]["opening_index"], current_time
+    )
+
+    # Serve what the response cache already has; compute the rest in one
+    # batch per (limit, order) combination
+    results = [None] * len(profiles)
+    pending = {}  # (limit, order) -> [(position, cache_key, dynamic_preferences)]
+    for position, profile in enumerate(profiles):
+        profile_args = profile_to_args(profile)
+        try:
+            dynamic_preferences, preferences_key = parse_recommendation_preferences(
+                profile_args, bundle["master_class_index"]
+            )
+        except ValueError:
+            results[position] = {"error": "Invalid year format for older_than parameter."}
+            continue
+        try:
+            limit, order = parse_result_options(profile_args)
+        except ValueError as e:
+            results[position] = {"error": str(e)}
+            continue
+        cache_key = (bundle["version"], preferences_key, limit, order, next_boundary)
+        cached = RECOMMENDATION_CACHE.get(cache_key, current_time)
+        if cached is not None:
+            results[position] = cached[0]
+        else:
+            pending.setdefault((limit, order), []).append(
+                (position, cache_key, dynamic_preferences)
+            )
+
+    for (limit, order), group in pending.items():
+        batch_openings = find_next_rare_openings_batch(
+            bundle["all_data"],
+            current_time,
+            [dynamic_preferences or None for _, _, dynamic_preferences in group],
+            limit,
+            order,
+        )
+        for (position, cache_key, dynamic_preferences), next_openings in zip(
+            group, batch_openings
+        ):
+            response_data = format_recommendations(next_openings, dynamic_preferences)
+            RECOMMENDATION_CACHE.put(
+                cache_key,
+                (response_data, recommendations_etag(bundle["version"], response_data)),
+                expires_at=results_expiry(
+                    bundle["all_data"], current_time, dynamic_preferences, next_boundary
+                ),
+            )
+            results[position] = response_data
+
+    return jsonify(
+        {
+            "results": [
+                {"id": profile.get("id"), "recommendations": result}
+                for profile, result in zip(profiles, results)
+            ]
+        }
     )
-    # --------------------------
 
+
+def profile_to_args(profile):
+    """Converts one batch profile dict into query-style args for preference parsing."""
+    args = MultiDict()
+    for key, value in profile.items():
+        if key == "id" or value is None:
+            continue
+        for item in value if isinstance(value, list) else [value]:
+            if isinstance(item, bool):
+                item = "true" if item else "false"
+            args.add(key, str(item))
+    return args
+
+
+def recommendations_etag(data_version, response_data):
+    """Strong ETag for a recommendations payload under a given data version."""
+    canonical = json.dumps(
+        response_data, sort_keys=True, separators=(",", ":"), ensure_ascii=False
+    )
+    return hashlib.sha256(f"{data_version}:{canonical}".encode("utf-8")).hexdigest()[:32]
+
+
+def build_recommendations_response(
+    all_data,
+    current_time,
+    dynamic_preferences,
+    limit=DEFAULT_RESULT_LIMIT,
+    order="time",
+):
+    """Runs the core logic and formats its result as the /api/next-opening payload."""
     # --- Pass preferences (including excluded wines) to core logic --- #
     next_openings = find_next_rare_opening(
-        ALL_DATA,
+        all_data,
         current_time,
         dynamic_preferences=dynamic_preferences if dynamic_preferences else None,
+        limit=limit,
+        order=order,
     )
     # -------------------------------------------------------------- #
+    return format_recommendations(next_openings, dynamic_preferences)
 
+
+def format_recommendations(next_openings, dynamic_preferences):
+    """Formats core-logic results as the /api/next-opening payload."""
     if not next_openings:
         # Message depends on whether preferences were applied
         message = (
             "No highly preferred rare openings available matching your schedule"
             + (" and selected preferences." if dynamic_preferences else ".")
         )
-        return jsonify({"message": message}), 200
+        return {"message": message}
 
     # Format the response according to API design
+    return [format_opening(opening) for opening in next_openings]
+
+
+def format_opening(opening):
+    """Formats one core-logic opening dict for the API responses."""
+    return {
+        "name": opening.get("name"),
+        "time": (
+            opening.get("datetime").isoformat() if opening.get("datetime") else None
+        ),
+        "stand": opening.get("stand"),
+        "glass_price": opening.get("glass_price"),
+        "preference_score": opening.get("preference_score", 0),
+    }
+
+
+@app.route("/api/itinerary", methods=["GET"])
+def get_itinerary():
+    """
+    API endpoint planning a conflict-free itinerary for the rest of the
+    festival, maximizing total preference score. Takes the preference
+    parameters of /api/next-opening plus visit_minutes (time per opening,
+    including the walk on to the next stand; longer walks delay the next
+    visit), min_score (lowest score worth a visit) and walking=false to
+    ignore walking times between stands.
+    """
+    bundle = load_data_if_needed()
+    all_data = bundle["all_data"]
+    if bundle["error"] or not all_data:
+        return (
+            jsonify({"error": "Data loading failed", "details": bundle["error"]}),
+            500,
+        )
+
+    try:
+        dynamic_preferences, preferences_key = parse_recommendation_preferences(
+            request.args, bundle["master_class_index"]
+        )
+    except ValueError:
+        return (
+            jsonify({"error": "Invalid year format for older_than parameter."}),
+            400,
+        )
+    try:
+        visit_minutes = int(request.args.get("visit_minutes") or DEFAULT_VISIT_MINUTES)
+        min_score = int(request.args.get("min_score") or 1)
+    except ValueError:
+        return (
+            jsonify({"error": "visit_minutes and min_score must be integers."}),
+            400,
+        )
+    if not 1 <= visit_minutes <= MAX_VISIT_MINUTES:
+        return (
+            jsonify({"error": f"visit_minutes must be between 1 and {MAX_VISIT_MINUTES}."}),
+            400,
+        )
+    include_walking = request.args.get("walking", "true").lower() != "false"
+
+    # The plan only changes when an opening starts (or, walking from the
+    # current stand, stops being reachable), like the recommendations
+    current_time = current_event_time()
+    next_boundary = next_opening_boundary(all_data["opening_index"], current_time)
+    cache_key = (
+        "itinerary",
+        bundle["version"],
+        preferences_key,
+        visit_minutes,
+        min_score,
+        include_walking,
+        next_boundary,
+    )
+    cached = RECOMMENDATION_CACHE.get(cache_key, current_time)
+    if cached is None:
+        plan = plan_itinerary(
+            all_data,
+            current_time,
+            dynamic_preferences=dynamic_preferences if dynamic_preferences else None,
+            visit_minutes=visit_minutes,
+            min_score=min_score,
+            include_walking=include_walking,
+        )
+        response_data = {
+            "total_score": plan["total_score"],
+            "visit_minutes": visit_minutes,
+            "openings": [format_opening(opening) for opening in plan["openings"]],
+        }
+        cached = (response_data, recommendations_etag(bundle["version"], response_data))
+        RECOMMENDATION_CACHE.put(
+            cache_key,
+            cached,
+            expires_at=(
+                results_expiry(all_data, current_time, dynamic_preferences, next_boundary)
+                if include_walking
+                else next_boundary
+            ),
+        )
+    response_data, etag = cached
+
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+    else:
+        response = jsonify(response_data)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+@app.route("/api/price-matches", methods=["GET"])
+def get_price_matches():
+    """API endpoint listing how each rare schedule wine was matched to a price, for auditing."""
+    bundle = load_data_if_needed()
+    all_data = bundle["all_data"]
+    if not all_data:
+        return (
+            jsonify({"error": "Data loading failed", "details": bundle["error"]}),
+            500,
+        )
+
     response_data = []
-    for opening in next_openings:
+    for name, match in sorted(all_data["price_table"].items()):
         response_data.append(
             {
-                "name": opening.get("name"),
-                "time": (
-                    opening.get("datetime").isoformat()
-                    if opening.get("datetime")
-                    else None
-                ),
-                "stand": opening.get("stand"),
-                "glass_price": opening.get("glass_price"),
-                "preference_score": opening.get("preference_score", 0),
+                "name": name,
+                "house": match.house if match else None,
+                "matched_name": match.matched_name if match else None,
+                "glass_price": match.glass_price if match else None,
+                "score": match.score if match else None,
+                "method": match.method if match else None,
             }
         )
-
     return jsonify(response_data)
 
 
+@app.route("/api/status", methods=["GET"])
+def get_status():
+    """API endpoint reporting data freshness and cache statistics for monitoring."""
+    bundle = load_data_if_needed()
+    all_data = bundle["all_data"]
+    return jsonify(
+        {
+            "data_version": bundle["version"],
+            "data_loaded_at": bundle["loaded_at"].isoformat(),
+            "data_error": bundle["error"],
+            "rare_openings": len(all_data["opening_index"].openings) if all_data else 0,
+            "master_classes": len(bundle["master_classes"] or []),
+            "normalize_cache": normalize_cache_stats(),
+            "response_cache": RECOMMENDATION_CACHE.stats(),
+            "startup": STARTUP_TIMINGS,
+        }
+    )
+
+
 # --- Main Execution ---
 if __name__ == "__main__":
     # This block is for local testing ONLY.
@@ -0,0 +1,153 @@
+"""
+Benchmarks the streaming class page extractor against the implementations it
+replaced, on the checked-in master_class_*.html corpus:
+
+    python -m src.bench_class_pages [corpus_dir] [repeats]
+
+Prints the time per page for each implementation and every page where the
+extracted wine lists differ from extract_class_page.
+"""
+import glob
+import os
+import re
+import sys
+import time
+
+from bs4 import BeautifulSoup
+
+from .class_page import extract_class_page
+
+DEFAULT_REPEATS = 20
+
+
+# --- Previous implementations, frozen for comparison --- #
+def regex_wines(html_content):
+    """parse_classes.extract_wines_from_class_html before the streaming extractor."""
+    wines = []
+    wine_list_regex = re.compile(
+        r"(?:<p><strong>Maisteltavat samppanjat:</strong></p>|<p><strong>Champagnes:</strong></p>).*?<ul>(.*?)</ul>",
+        re.DOTALL | re.IGNORECASE,
+    )
+    list_item_regex = re.compile(r"<li.*?>(.*?)</li>", re.DOTALL | re.IGNORECASE)
+
+    match = wine_list_regex.search(html_content)
+    if match:
+        for item in list_item_regex.findall(match.group(1)):
+            cleaned_wine = re.sub("<.*?>", "", item).strip()
+            cleaned_wine = cleaned_wine.replace("&amp;", "&").replace("&#8211;", "–")
+            if cleaned_wine:
+                wines.append(cleaned_wine)
+    return wines
+
+
+def soup_wines(html_content):
+    """scraper.parse_detail_page (wine list part) before the streaming extractor."""
+    soup = BeautifulSoup(html_content, "html.parser")
+    content_area = soup.find("div", class_="post-content")
+    if not content_area:
+        return []
+    wine_list_header = content_area.find(
+        lambda tag: tag.name in ["h2", "h3", "strong", "p"]
+        and (
+            "Maisteltavat samppanjat:" in tag.get_text()
+            or "Champagnes:" in tag.get_text()
+        )
+    )
+    wines = []
+    if wine_list_header:
+        element = wine_list_header.find_next_sibling()
+        processed_text = set()
+        while element:
+            if element.name in ["h2", "h3"] or (
+                element.name == "p"
+                and element.find("a", href=lambda href: href and "mailto:" in href)
+            ):
+                break
+            if element.name == "ul":
+                for li in element.find_all("li"):
+                    wine_name = li.get_text(strip=True)
+                    if wine_name and wine_name not in processed_text:
+                        wines.append(wine_name)
+                        processed_text.add(wine_name)
+            elif element.name == "p":
+                raw_html = element.decode_contents()
+                for part in raw_html.split("<br/>"):
+                    wine_name = BeautifulSoup(part, "html.parser").get_text(strip=True)
+                    if (
+                        wine_name
+                        and len(wine_name) > 5
+                        and not wine_name.isupper()
+                        and "Please note" not in wine_name
+                        and "Buy a ticket" not in wine_name
+                        and wine_name not in processed_text
+                    ):
+                        wines.append(wine_name)
+                        processed_text.add(wine_name)
+            element = element.find_next_sibling()
+    return wines
+
+
+def streaming_wines(html_content):
+    return extract_class_page(html_content).wines
+
+
+IMPLEMENTATIONS = (
+    ("streaming", streaming_wines),
+    ("regex", regex_wines),
+    ("beautifulsoup", soup_wines),
+)
+
+
+# --- Benchmark --- #
+def time_per_page(extract, pages, repeats):
+    """Best-of-`repeats` wall time for one pass over all pages, divided per page."""
+    best = float("inf")
+    for _ in range(repeats):
+        started = time.perf_counter()
+        for html_content in pages.values():
+            extract(html_content)
+        best = min(best, time.perf_counter() - started)
+    return best / len(pages)
+
+
+def run_benchmark(corpus_dir, repeats=DEFAULT_REPEATS):
+    paths = sorted(
+        glob.glob(os.path.join(corpus_dir, "master_class_*.html")),
+        key=lambda path: int(re.search(r"(\d+)\.html$", path).group(1)),
+    )
+    if not paths:
+        print(f"No master_class_*.html files in {corpus_dir}", file=sys.stderr)
+        return
+    pages = {}
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            pages[os.path.basename(path)] = f.read()
+    total_kb = sum(len(html_content) for html_content in pages.values()) / 1024
+    print(f"{len(pages)} pages, {total_kb:.0f} KiB, best of {repeats} passes\n")
+
+    baseline = None
+    for name, extract in IMPLEMENTATIONS:
+        per_page = time_per_page(extract, pages, repeats)
+        baseline = baseline or per_page
+        print(f"  {name:<14} {per_page * 1e6:9.1f} us/page  ({per_page / baseline:5.1f}x)")
+
+    print("\nWine lists differing from the streaming extractor:")
+    differences = 0
+    for filename, html_content in pages.items():
+        expected = streaming_wines(html_content)
+        for name, extract in IMPLEMENTATIONS[1:]:
+            wines = extract(html_content)
+            if wines != expected:
+                differences += 1
+                print(f"  {filename} ({name}):")
+                print(f"    only {name}: {[w for w in wines if w not in expected]}")
+                print(f"    only streaming: {[w for w in expected if w not in wines]}")
+    if not differences:
+        print("  none")
+
+
+if __name__ == "__main__":
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    corpus_dir = sys.argv[1] if len(sys.argv) > 1 else project_root
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_REPEATS
+    run_benchmark(corpus_dir, repeats)
@@ -0,0 +1,299 @@
+import re
+from collections import namedtuple
+from html import unescape
+
+# Headings that introduce the wine list on a master class page
+WINE_LIST_HEADINGS = ("Maisteltavat samppanjat:", "Champagnes:")
+# Paragraph-style lists: lines that are never wine names
+NON_WINE_PHRASES = ("Please note", "Huomioithan", "Buy a ticket")
+
+# title: first <h2> inside div.post-content (else <h1 class="entry-title">), or None
+# wines: the wine names listed in the blocks after the first wine list heading
+# has_content: whether the page has a div.post-content at all
+ClassPage = namedtuple("ClassPage", ["title", "wines", "has_content"])
+
+_HEADING_BLOCKS = frozenset(["p", "h2", "h3", "h4", "strong"])
+_SECTION_BREAKS = frozenset(["h2", "h3"])
+
+# --- Tokenizer --- #
+# Next tag, comment, doctype or processing instruction. Attribute values may
+# contain ">", so quoted values are matched as a whole.
+_MARKUP = re.compile(
+    r"<(?:(/?)([a-zA-Z][a-zA-Z0-9]*)((?:[^>\"']|\"[^\"]*\"|'[^']*')*)>|!--|[!?][^>]*>)"
+)
+_CLASS_ATTRIBUTE = re.compile(
+    r"""\bclass\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+))""", re.IGNORECASE
+)
+_HREF_ATTRIBUTE = re.compile(
+    r"""\bhref\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+))""", re.IGNORECASE
+)
+# Where tokenizing starts: nothing before the first title or content tag is used
+_LANDMARK = re.compile(
+    r"<(?:(h1|div)\b((?:[^>\"']|\"[^\"]*\"|'[^']*')*)>|(script|style)\b|!--)", re.IGNORECASE
+)
+# Raw-text elements are skipped without tokenizing: the theme inlines ~1 MB of
+# CSS ahead of the content.
+_RAW_TEXT_TAGS = frozenset(["script", "style"])
+
+
+def _end_of(html_content, terminator, start):
+    """
+    Position just past the next `terminator` (lowercase, matched in any case),
+    or the end of the page.
+    """
+    # Hop between occurrences of the first character: a single-character
+    # str.find skips a megabyte of CSS ~20x faster than a multi-character one.
+    first, length = terminator[0], len(terminator)
+    position = html_content.find(first, start)
+    while position != -1:
+        if html_content[position : position + length].lower() == terminator:
+            return position + length
+        position = html_content.find(first, position + 1)
+    return len(html_content)
+
+
+def _first_landmark(html_content):
+    """
+    Position of the first <h1 class="entry-title"> or <div class="post-content">
+    outside comments and <script>/<style>, or None if the page has neither.
+    """
+    position = 0
+    while True:
+        match = _LANDMARK.search(html_content, position)
+        if match is None:
+            return None
+        position = match.end()
+        if match.group(1):
+            class_name = "entry-title" if match.group(1).lower() == "h1" else "post-content"
+            if _has_class(match.group(2), class_name):
+                return match.start()
+        elif match.group(3):
+            position = _end_of(html_content, f"</{match.group(3).lower()}", position)
+            position = _end_of(html_content, ">", position)
+        else:
+            position = _end_of(html_content, "-->", position)
+
+
+def _tokens(html_content, position=0):
+    """
+    Lazily yields ("start", tag, attributes), ("end", tag, None) and
+    ("text", raw_text, None) tokens in document order. Tag names are
+    lowercased, attributes are the raw attribute string and text is not yet
+    unescaped. Comments and the contents of <script>/<style> are skipped.
+    """
+    while True:
+        match = _MARKUP.search(html_content, position)
+        if match is None:
+            if position < len(html_content):
+                yield "text", html_content[position:], None
+            return
+        if match.start() > position:
+            yield "text", html_content[position : match.start()], None
+        position = match.end()
+
+        tag = match.group(2)
+        if tag is None:
+            if match.group(0) == "<!--":
+                position = _end_of(html_content, "-->", position)
+            continue
+        tag = tag.lower()
+        if match.group(1):
+            yield "end", tag, None
+            continue
+        yield "start", tag, match.group(3)
+        if tag in _RAW_TEXT_TAGS:
+            position = _end_of(html_content, f"</{tag}", position)
+            position = _end_of(html_content, ">", position)
+
+
+def _attribute(pattern, attributes):
+    match = pattern.search(attributes)
+    if not match:
+        return None
+    return next(group for group in match.groups() if group is not None)
+
+
+def _has_class(attributes, class_name):
+    value = _attribute(_CLASS_ATTRIBUTE, attributes)
+    return value is not None and class_name in value.split()
+
+
+def _is_mailto_link(attributes):
+    href = _attribute(_HREF_ATTRIBUTE, attributes)
+    return href is not None and href.strip().lower().startswith("mailto:")
+
+
+class _ClassPageParser:
+    """
+    Single-pass extractor for a master class page. Finds the wine list
+    heading, then reads the <ul> (one wine per <li>) and <p> (one wine per
+    <br>-separated line) blocks after it, like the sibling walk it replaced:
+    a list split over several blocks is read in full. It marks itself done at
+    the next <h2>/<h3>, at a paragraph with a mailto: link (contact details,
+    not wines) or when the heading's container closes, so the rest of the
+    page is never tokenized.
+    """
+
+    def __init__(self):
+        self.done = False
+        self.has_content = False
+        self.title = None
+        self.entry_title = None
+        self.wines = []
+        self._content_div_depth = 0  # Open <div>s since div.post-content (0 = outside)
+        self._title_text = None  # Text of the <h2>/<h1> title being read
+        self._title_tag = None
+        self._block_text = None  # Text of the <p>/<h*> that may be the list heading
+        self._block_tag = None
+        self._after_heading = False
+        self._heading_div_depth = None  # _content_div_depth where the heading was
+        self._list_tag = None  # "ul" or "p" while inside a wine block
+        self._list_depth = 0  # Open <ul>s in the current "ul" block
+        self._item_text = None
+        self._paragraph_wines = None  # Lines of the current "p" block, kept at </p>
+
+    def parse(self, html_content):
+        start = _first_landmark(html_content)
+        if start is None:
+            return
+        for kind, value, attributes in _tokens(html_content, start):
+            if kind == "text":
+                self.handle_data(value)
+            elif kind == "start":
+                self.handle_starttag(value, attributes)
+            else:
+                self.handle_endtag(value)
+            if self.done:
+                break
+        self._end_paragraph()  # A page that ends inside the last paragraph
+
+    # --- Token handlers --- #
+    def handle_starttag(self, tag, attributes):
+        if tag == "div":
+            if self._content_div_depth:
+                self._content_div_depth += 1
+            elif _has_class(attributes, "post-content"):
+                self.has_content = True
+                self._content_div_depth = 1
+        elif tag == "h1" and self.entry_title is None and _has_class(attributes, "entry-title"):
+            self._title_tag, self._title_text = "h1", []
+        elif tag == "h2" and self._content_div_depth and self.title is None:
+            self._title_tag, self._title_text = "h2", []
+
+        if self._list_tag == "p" and (tag in ("p", "ul") or tag in _SECTION_BREAKS):
+            self._end_paragraph()  # Implicitly closed by the next block
+
+        if self._list_tag == "ul":
+            if tag == "li":
+                if self._item_text is not None:  # Nested item: keep the outer item's text
+                    self._add_wine("".join(self._item_text).strip())
+                self._item_text = []
+            elif tag == "ul":
+                self._list_depth += 1
+        elif self._list_tag == "p":
+            if tag == "br":
+                self._end_line()
+            elif tag == "a" and _is_mailto_link(attributes):
+                # Contact details: drop this paragraph and end the list
+                self._list_tag = self._item_text = self._paragraph_wines = None
+                self.done = True
+        elif self._after_heading:
+            # Blocks after the heading: each <ul> or <p> may hold wines
+            if tag == "ul":
+                self._list_tag, self._list_depth = "ul", 1
+            elif tag == "p":
+                self._list_tag, self._item_text, self._paragraph_wines = "p", [], []
+            elif tag in _SECTION_BREAKS:
+                self.done = True
+        elif tag in _HEADING_BLOCKS and (
+            self._block_tag is None or (tag == "p" and self._block_tag == "p")
+        ):
+            # A new <p> also ends an unclosed one
+            self._block_tag, self._block_text = tag, []
+
+    def handle_endtag(self, tag):
+        if tag == "div" and self._content_div_depth:
+            self._content_div_depth -= 1
+            if self._after_heading and self._content_div_depth < self._heading_div_depth:
+                self._end_paragraph()
+                self.done = True  # End of the heading's container
+                return
+        if tag == self._title_tag:
+            text = "".join(self._title_text).strip()
+            if tag == "h2":
+                self.title = text
+            else:
+                self.entry_title = text
+            self._title_tag = self._title_text = None
+
+        if self._list_tag == "ul":
+            if tag == "li" and self._item_text is not None:
+                self._add_wine("".join(self._item_text).strip())
+                self._item_text = None
+            elif tag == "ul":
+                self._list_depth -= 1
+                if not self._list_depth:
+                    self._list_tag = None
+        elif self._list_tag == "p":
+            if tag == "p":
+                self._end_paragraph()
+        elif tag == self._block_tag:
+            text = "".join(self._block_text)
+            self._block_tag = self._block_text = None
+            if any(heading in text for heading in WINE_LIST_HEADINGS):
+                self._after_heading = True
+                self._heading_div_depth = self._content_div_depth
+
+    def handle_data(self, raw_text):
+        if self._title_text is None and self._block_text is None and self._item_text is None:
+            return  # Most of the page: not worth unescaping
+        text = unescape(raw_text)
+        if self._title_text is not None:
+            self._title_text.append(text)
+        if self._block_text is not None:
+            self._block_text.append(text)
+        if self._item_text is not None:
+            self._item_text.append(text)
+
+    # --- Helpers --- #
+    def _end_line(self):
+        """Ends one <br>-separated line of a paragraph-style wine list."""
+        line = "".join(self._item_text).strip()
+        self._item_text = []
+        # Heuristics: not too short, not just uppercase (like headers), not irrelevant phrases
+        if (
+            len(line) > 5
+            and not line.isupper()
+            and not any(phrase in line for phrase in NON_WINE_PHRASES)
+        ):
+            self._paragraph_wines.append(line)
+
+    def _end_paragraph(self):
+        """Ends a <p> block, keeping its lines unless it held a mailto: link."""
+        if self._list_tag != "p":
+            return
+        self._end_line()
+        for name in self._paragraph_wines:
+            self._add_wine(name)
+        self._list_tag = self._item_text = self._paragraph_wines = None
+
+    def _add_wine(self, name):
+        if name and name not in self.wines:  # Avoid duplicates from nested tags
+            self.wines.append(name)
+
+
+def extract_class_page(html_content):
+    """
+    Extracts the title and wine list from a master class page, tokenizing
+    only as far as the end of the wine list.
+
+    Returns:
+        ClassPage: The extracted title, wines and whether the page has content.
+    """
+    parser = _ClassPageParser()
+    parser.parse(html_content)
+    return ClassPage(
+        title=parser.title if parser.title is not None else parser.entry_title,
+        wines=parser.wines,
+        has_content=parser.has_content,
+    )
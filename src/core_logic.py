@@ -1,39 +1,168 @@
+from bisect import bisect_right
+from collections import namedtuple
 from datetime import datetime, timedelta
+from functools import lru_cache
+from types import MappingProxyType
+import heapq
 import re
 import sys
 import os
 
-# Import the fuzzy matching library
-from thefuzz import process, fuzz
+import numpy as np
 
 # Import the parsing functions
 from .data_parser import (
     parse_rare_schedule,
     parse_wine_list,
     parse_preferences,
+    parse_stand_map,
 )
+from .intervals import merge_intervals
+from .walking import build_walking_model
+from .snapshot import (
+    SNAPSHOT_FILENAME,
+    file_sha256,
+    file_signature,
+    load_snapshot,
+    parser_fingerprint,
+    save_snapshot,
+)
+
+# --- Input Sources ---
+# Each source is parsed independently and cached in the snapshot under its key.
+DATA_SOURCES = {
+    "rare_schedule": ("Rare_schedule_2025.pdf", parse_rare_schedule),
+    "wine_list": ("Wine_list_2025.pdf", parse_wine_list),
+    "preferences": ("preferences.txt", parse_preferences),
+    "stand_map": ("stands.json", parse_stand_map),
+}
+# Sources parsed with PDF page text extraction, which takes a worker count
+PDF_SOURCES = frozenset(["rare_schedule", "wine_list"])
+# ---------------------
+
+
+def source_signatures(material_dir):
+    """Returns the change-detection signature of every input file, keyed by source."""
+    return {
+        key: file_signature(os.path.join(material_dir, filename))
+        for key, (filename, _) in DATA_SOURCES.items()
+    }
 
 
-def load_all_data(material_dir):
-    """Loads all data from files within the specified directory."""
+def load_all_data(material_dir, previous=None, changed_sources=None, pdf_workers=None):
+    """
+    Loads all data from files within the specified directory.
+
+    Parsed results are read from the snapshot in material_dir when the content
+    hash of their source file is unchanged; only stale sources are re-parsed,
+    after which the snapshot is rewritten for the next worker. The price table
+    is snapshotted the same way, so a worker starting from an up-to-date
+    snapshot neither imports pdfplumber nor fuzzy matches any names. A source
+    that fails to parse raises before anything is snapshotted, so the failure
+    is retried on the next load instead of being cached as empty data.
+
+    When `previous` (an earlier result of this function) and `changed_sources`
+    are given, sources not listed in `changed_sources` are reused from
+    `previous` without touching their files at all.
+
+    PDFs are parsed on `pdf_workers` processes (default PDF_WORKERS); the
+    server passes 1 so it never starts processes from a request worker.
+    """
     print("Loading all data...")
     try:
-        # Construct full paths using the provided directory
-        rare_schedule_path = os.path.join(material_dir, "Rare_schedule_2025.pdf")
-        wine_list_path = os.path.join(material_dir, "Wine_list_2025.pdf")
-        preferences_path = os.path.join(material_dir, "preferences.txt")
-
-        rare_schedule = parse_rare_schedule(rare_schedule_path)
-        wine_details, house_names = parse_wine_list(wine_list_path)
-        preferences = parse_preferences(preferences_path)
-        print("Data loading complete.")
-
-        return {
-            "rare_schedule": rare_schedule,
+        snapshot_path = os.path.join(material_dir, SNAPSHOT_FILENAME)
+        fingerprint = parser_fingerprint()
+        snapshot = load_snapshot(snapshot_path)
+        if snapshot and snapshot.get("parser") != fingerprint:
+            print("Parser code changed since snapshot was built; re-parsing all sources.")
+            snapshot = None
+        cached_sources = snapshot["sources"] if snapshot else {}
+        previous_sources = previous.get("sources", {}) if previous else {}
+
+        parsed = {}
+        fresh_sources = {}
+        snapshot_stale = set(cached_sources) != set(DATA_SOURCES)
+        for key, (filename, parse_func) in DATA_SOURCES.items():
+            if (
+                changed_sources is not None
+                and key not in changed_sources
+                and key in previous_sources
+            ):
+                parsed[key] = previous_sources[key]["data"]
+                fresh_sources[key] = previous_sources[key]
+                continue
+
+            # Construct full paths using the provided directory
+            path = os.path.join(material_dir, filename)
+            content_hash = file_sha256(path)
+            cached = cached_sources.get(key)
+            if content_hash and cached and cached.get("sha256") == content_hash:
+                parsed[key] = cached["data"]
+                fresh_sources[key] = cached
+                continue
+
+            print(f"Parsing {filename} (no up-to-date snapshot entry)...")
+            if key in PDF_SOURCES:
+                parsed[key] = parse_func(path, workers=pdf_workers)
+            else:
+                parsed[key] = parse_func(path)
+            snapshot_stale = True
+            # A missing file is stored with sha256=None, which never matches on load
+            fresh_sources[key] = {"sha256": content_hash, "data": parsed[key]}
+
+        wine_details, house_names = parsed["wine_list"]
+        all_data = {
+            "rare_schedule": parsed["rare_schedule"],
             "wine_details": wine_details,
             "house_names": house_names,
-            "preferences": preferences,
+            "preferences": parsed["preferences"],
+            "stand_map": parsed["stand_map"],
+            # Per-source parser output and content hash, reused on partial reloads
+            "sources": fresh_sources,
         }
+        all_data["house_trie"] = build_house_trie(house_names)
+
+        # The price table only depends on the two PDFs and the matching code,
+        # so it is reused (and snapshotted) rather than fuzzy matched per worker
+        price_inputs = price_table_inputs(fresh_sources)
+        cached_prices = snapshot.get("price_table") if snapshot else None
+        if price_inputs and previous and previous.get("price_table_inputs") == price_inputs:
+            all_data["price_table"] = previous["price_table"]
+        elif price_inputs and cached_prices and cached_prices.get("inputs") == price_inputs:
+            all_data["price_table"] = cached_prices["data"]
+        else:
+            all_data["price_table"] = build_price_table(all_data)
+            snapshot_stale = True
+        all_data["price_table_inputs"] = price_inputs
+
+        if snapshot_stale:
+            try:
+                save_snapshot(
+                    snapshot_path,
+                    {
+                        "parser": fingerprint,
+                        "sources": fresh_sources,
+                        "price_table": {
+                            "inputs": price_inputs,
+                            "data": all_data["price_table"],
+                        },
+                    },
+                )
+                print(f"Wrote data snapshot to {snapshot_path}")
+            except OSError as e:
+                print(f"Warning: Could not write snapshot {snapshot_path}: {e}", file=sys.stderr)
+
+        # The stand map is optional: an inconsistent one disables walking times
+        # like a missing file, instead of failing the whole load
+        try:
+            all_data["walking_model"] = build_walking_model(parsed["stand_map"])
+        except ValueError as e:
+            print(f"Warning: Invalid stand map, walking times disabled: {e}", file=sys.stderr)
+            all_data["walking_model"] = None
+        all_data["opening_index"] = build_opening_index(all_data)
+        print("Data loading complete.")
+
+        return all_data
     except FileNotFoundError as e:
         print(f"Error loading data: Input file not found. {e}", file=sys.stderr)
         raise  # Re-raise the exception to be caught by the caller (app.py)
@@ -43,184 +172,193 @@ def load_all_data(material_dir):
 
 
 # --- Helper function for name normalization ---
-def normalize_name(name):
-    """Normalizes champagne names for better matching."""
-    if not name:
-        return ""
+# Every schedule name, wine list name and MC wine passes through here, and the
+# same few hundred names recur on every load and request, so results are cached.
+NORMALIZE_CACHE_SIZE = 4096
+BASE_YEAR_PATTERN = re.compile(r"\(base \d{4}\)")
+WHITESPACE_PATTERN = re.compile(r"\s+")
+ASTERISK_SUFFIX_PATTERN = re.compile(r"\s*\*.*$")
+# Remove only bottle sizes and 'nv'
+SUFFIXES_TO_REMOVE = frozenset(
+    ["magnum", "jeroboam", "methuselah", "nabuchodonosor", "nv"]
+)
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def _normalize_name_uncached(name):
     name = name.lower()
     # Remove specific patterns like (base YYYY)
-    name = re.sub(r"\(base \d{4}\)", "", name)
-    # Remove trailing asterisk if it's the VERY last character
-    # name = name.rstrip("*").strip() # We handle '*' below now
-    # Remove only bottle sizes and 'nv'
-    suffixes_to_remove = ["magnum", "jeroboam", "methuselah", "nabuchodonosor", "nv"]
+    name = BASE_YEAR_PATTERN.sub("", name)
 
     # Split, filter, rejoin to handle suffixes as separate words
     words = name.split()
-    normalized_words = [word for word in words if word not in suffixes_to_remove]
+    normalized_words = [word for word in words if word not in SUFFIXES_TO_REMOVE]
     name = " ".join(normalized_words)
 
     # Keep years and common descriptors
     # Remove extra whitespace that might have been introduced
-    name = re.sub(r"\s+", " ", name).strip()
+    name = WHITESPACE_PATTERN.sub(" ", name).strip()
 
     # --- Updated: Remove trailing asterisk and anything after it --- #
-    name = re.sub(r"\s*\*.*$", "", name).strip()
+    name = ASTERISK_SUFFIX_PATTERN.sub("", name).strip()
     # ------------------------------------------------------------
-
-    # --- Remove Debug Print ---
-    # if "canard" in original_input.lower():
-    #     print(f"DEBUG NORMALIZE: Input='{original_input}' -> Output='{name}'", file=sys.stderr)
-    # -------------------------
     return name
 
 
-# --- Updated Name Matching Logic --- (Using House Names)
-def find_price_for_rare_wine(rare_wine_name, wine_details, house_names):
+def normalize_name(name):
+    """Normalizes champagne names for better matching (memoized, bounded LRU)."""
+    if not name:
+        return ""
+    return _normalize_name_uncached(name)
+
+
+def normalize_names(names):
+    """Normalizes a whole iterable of names in one call, returning a list."""
+    cached = _normalize_name_uncached
+    return [cached(name) if name else "" for name in names]
+
+
+def normalize_cache_stats():
+    """Hit/miss statistics of the normalize_name cache."""
+    info = _normalize_name_uncached.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        "hits": info.hits,
+        "misses": info.misses,
+        "hit_rate": round(info.hits / lookups, 4) if lookups else None,
+        "size": info.currsize,
+        "max_size": info.maxsize,
+    }
+
+
+# --- House Name Prefix Trie ---
+_HOUSE_END = ""  # Trie key marking the end of a house name; never a real character
+
+
+def build_house_trie(house_names):
+    """Builds a character trie of lowercase house names for prefix lookups."""
+    trie = {}
+    for house in house_names:
+        node = trie
+        for char in house.lower():
+            node = node.setdefault(char, {})
+        node[_HOUSE_END] = house
+    return trie
+
+
+def match_house(house_trie, wine_name):
     """
-    Attempts to find the price details for a rare wine name by first matching
-    the house name and then fuzzy matching the specific wine part.
+    Finds the longest house name that starts wine_name and ends on a word
+    boundary ('Bonnet' does not match 'Bonnet-Gilmert ...' if that house
+    exists, but does match 'Bonnet Brut'), in one pass over the name.
+
+    Returns:
+        str: The house name as written in the wine list, or None.
     """
-    if not rare_wine_name or not wine_details or not house_names:
+    if not wine_name:
         return None
-
-    # Find the house name that matches the start of the rare wine name
+    name_lower = wine_name.lower()
     matched_house = None
-    specific_wine_part = None
-    rare_wine_name_lower = rare_wine_name.lower()
+    node = house_trie
+    for i, char in enumerate(name_lower):
+        node = node.get(char)
+        if node is None:
+            break
+        if _HOUSE_END in node and (
+            i + 1 == len(name_lower) or not name_lower[i + 1].isalnum()
+        ):
+            matched_house = node[_HOUSE_END]
+    return matched_house
+
+
+# --- Updated Name Matching Logic --- (Using House Names)
+SIMILARITY_THRESHOLD = 80  # Minimum WRatio score accepted for a fuzzy match
+FUZZY_SCORE_CUTOFF = 60  # Keep cutoff low for potential matches
+
+# How one rare wine name was matched to a wine list entry.
+# method is "exact" or "fuzzy"; score is 100 for exact matches.
+PriceMatch = namedtuple(
+    "PriceMatch", ["house", "matched_name", "glass_price", "score", "method"]
+)
 
-    # Sort houses by length descending to check longer names first
-    sorted_house_names = sorted(house_names, key=len, reverse=True)
 
-    for house in sorted_house_names:
+def build_house_price_maps(wine_details, house_names):
+    """
+    Groups the wine list by house once: {house: {normalized specific part: full name}}.
+    A wine belongs to every house its full name starts with, as before.
+    """
+    house_price_maps = {}
+    for house in house_names:
         house_lower = house.lower()
-        # Check if rare name starts with house name, ensuring a word boundary or end of string
-        # This prevents partial matches like 'Bonnet' matching 'Bonnet-Gilmert'
-        if rare_wine_name_lower.startswith(house_lower) and (
-            len(rare_wine_name) == len(house)
-            or not rare_wine_name_lower[len(house)].isalnum()
-        ):
-            matched_house = house
-            # Extract the part after the house name
-            specific_wine_part = rare_wine_name[len(house) :].strip()
-            break  # Found the longest matching house
-
-    if not matched_house or not specific_wine_part:
-        # --- Remove specific debug block ---
-        # if rare_wine_name in [
-        #     "Lombard Vintage 2008",
-        #     "Leclaire-Thiefaine Cuvée 03 Grand Cru de Cramant 2020",
-        # ]:
-        #     print(
-        #         f"DEBUG Price Match: Could not identify house for '{rare_wine_name}'",
-        #         file=sys.stderr,
-        #     )
-        # ----------------------------------
-        return None
+        full_names = [
+            full_name
+            for full_name in wine_details
+            if full_name and full_name.lower().startswith(house_lower)
+        ]
+        specific_parts = [full_name[len(house) :].strip() for full_name in full_names]
+        house_price_maps[house] = dict(zip(normalize_names(specific_parts), full_names))
+    return house_price_maps
+
+
+def match_price_for_rare_wine(
+    rare_wine_name, wine_details, house_names, house_price_maps=None, house_trie=None
+):
+    """
+    Matches a rare wine name to a wine list entry by first matching the house
+    name and then exact or fuzzy matching the specific wine part.
 
-    # --- Remove specific debug block ---
-    # debug_this_wine = rare_wine_name in [
-    #     "Lombard Vintage 2008",
-    #     "Leclaire-Thiefaine Cuvée 03 Grand Cru de Cramant 2020",
-    # ]
-    debug_this_wine = False  # Keep variable defined, but always false
-    # ----------------------------------
+    Returns:
+        PriceMatch: The match, or None if no entry was close enough.
+    """
+    if not rare_wine_name or not wine_details or not house_names:
+        return None
 
-    if debug_this_wine:
-        print(f"\nDEBUG Price Match Attempt for: '{rare_wine_name}'", file=sys.stderr)
-        print(
-            f"  -> Identified House: '{matched_house}', Specific Part: '{specific_wine_part}'",
-            file=sys.stderr,
-        )
+    # Find the longest house name that matches the start of the rare wine name
+    if house_trie is None:
+        house_trie = build_house_trie(house_names)
+    matched_house = match_house(house_trie, rare_wine_name)
+    if not matched_house:
+        return None
+    # Extract the part after the house name
+    specific_wine_part = rare_wine_name[len(matched_house) :].strip()
+    if not specific_wine_part:
+        return None
 
     normalized_specific_part = normalize_name(specific_wine_part)
     if not normalized_specific_part:
-        # --- Remove specific debug block ---
-        # if debug_this_wine:
-        #     print(
-        #         f"  -> Failed to normalize specific part: '{specific_wine_part}'",
-        #         file=sys.stderr,
-        #     )
-        # ----------------------------------
         return None
 
-    # Filter wine_details to only include items from the matched house
-    house_wines = {
-        name: details
-        for name, details in wine_details.items()
-        if name.lower().startswith(matched_house.lower())
-    }
-
-    if not house_wines:
-        # --- Remove specific debug block ---
-        # if debug_this_wine:
-        #     print(
-        #         f"  -> No wines found in price list for house '{matched_house}'",
-        #         file=sys.stderr,
-        #     )
-        # ----------------------------------
+    # Normalized names of this house's wines only
+    if house_price_maps is None:
+        house_price_maps = build_house_price_maps(wine_details, [matched_house])
+    house_price_name_map = house_price_maps.get(matched_house)
+    if not house_price_name_map:
         return None
 
-    # Prepare normalized names map ONLY for this house's wines
-    house_price_name_map = {}
-    for k in house_wines.keys():
-        if not k:
-            continue
-        specific_part = k[len(matched_house) :].strip()
-        normalized_key = normalize_name(specific_part)
-        house_price_name_map[normalized_key] = k
-
-    normalized_house_price_names = list(house_price_name_map.keys())
-
-    # --- Remove specific debug block ---
-    # if debug_this_wine:
-    #     print(
-    #         f"  -> Searching '{normalized_specific_part}' against {len(normalized_house_price_names)} normalized names from house '{matched_house}'. Full list:",
-    #         file=sys.stderr,
-    #     )
-    #     for i, price_name in enumerate(normalized_house_price_names):
-    #         print(f"     [{i}] '{price_name}'", file=sys.stderr)
-    # ----------------------------------
-
     # 1. Try exact match on normalized specific parts within the house
     if normalized_specific_part in house_price_name_map:
         original_full_name = house_price_name_map[normalized_specific_part]
-        # --- Remove specific debug block ---
-        # if debug_this_wine:
-        #     print(
-        #         f"  SUCCESS (Exact): Found exact normalized match '{normalized_specific_part}' for house '{matched_house}'",
-        #         file=sys.stderr,
-        #     )
-        # ----------------------------------
-        return wine_details[original_full_name].get("glass_price")
+        return PriceMatch(
+            house=matched_house,
+            matched_name=original_full_name,
+            glass_price=wine_details[original_full_name].get("glass_price"),
+            score=100,
+            method="exact",
+        )
 
     # 2. Try fuzzy matching on normalized specific parts within the house
-    top_matches = []
-    best_match_tuple = None
+    # (thefuzz is only imported once a name actually needs it)
+    from thefuzz import fuzz, process
 
     try:
-        extracted_matches = process.extractWithoutOrder(
-            normalized_specific_part,
-            normalized_house_price_names,
-            scorer=fuzz.WRatio,
-            score_cutoff=60,  # Keep cutoff low for potential matches
+        extracted_matches = list(
+            process.extractWithoutOrder(
+                normalized_specific_part,
+                list(house_price_name_map.keys()),
+                scorer=fuzz.WRatio,
+                score_cutoff=FUZZY_SCORE_CUTOFF,
+            )
         )
-
-        if isinstance(extracted_matches, list) and extracted_matches:
-            top_matches = extracted_matches
-            best_match_tuple = max(top_matches, key=lambda x: x[1])
-
-            # --- Remove specific debug block ---
-            # if debug_this_wine:
-            #     print(f"  -> Top Fuzzy Candidates (Score >= 60):", file=sys.stderr)
-            #     for match, score in sorted(
-            #         top_matches, key=lambda x: x[1], reverse=True
-            #     )[:5]:
-            #         print(f"     - '{match}' (Score: {score})", file=sys.stderr)
-            # elif debug_this_wine:
-            #     print("  -> No fuzzy matches found above cutoff 60.", file=sys.stderr)
-            # ----------------------------------
-
     except Exception as e:
         print(
             f"ERROR during fuzzy matching process for house '{matched_house}', specific part '{normalized_specific_part}': {e}",
@@ -228,30 +366,71 @@ def find_price_for_rare_wine(rare_wine_name, wine_details, house_names):
         )
         return None
 
-    SIMILARITY_THRESHOLD = 80  # Lowered threshold
-    if best_match_tuple:
-        best_match_str, best_score = best_match_tuple
+    if extracted_matches:
+        best_match_str, best_score = max(extracted_matches, key=lambda x: x[1])
         if best_score >= SIMILARITY_THRESHOLD:
             original_full_name = house_price_name_map[best_match_str]
-            # --- Remove specific debug block ---
-            # if debug_this_wine:
-            #     print(
-            #         f"  SUCCESS (Fuzzy): Found fuzzy match '{best_match_str}' with score {best_score} >= {SIMILARITY_THRESHOLD}",
-            #         file=sys.stderr,
-            #     )
-            # ----------------------------------
-            return wine_details[original_full_name].get("glass_price")
-        # --- Remove specific debug block ---
-        # elif debug_this_wine:
-        #     print(
-        #         f"  FAILURE: Best fuzzy match '{best_match_str}' score {best_score} < {SIMILARITY_THRESHOLD}",
-        #         file=sys.stderr,
-        #     )
-        # ----------------------------------
+            return PriceMatch(
+                house=matched_house,
+                matched_name=original_full_name,
+                glass_price=wine_details[original_full_name].get("glass_price"),
+                score=best_score,
+                method="fuzzy",
+            )
 
     return None  # Price not found
 
 
+def find_price_for_rare_wine(rare_wine_name, wine_details, house_names):
+    """Returns the glass price for a rare wine name, or None if it cannot be matched."""
+    match = match_price_for_rare_wine(rare_wine_name, wine_details, house_names)
+    return match.glass_price if match else None
+
+
+# Hash of this file: a snapshotted price table is rebuilt when the matching code changes
+MATCHER_FINGERPRINT = file_sha256(__file__)
+
+
+def price_table_inputs(sources):
+    """
+    Everything build_price_table depends on: the content hashes of the rare
+    schedule and wine list, and the matching code.
+
+    Returns:
+        tuple: The inputs, or None if either PDF is missing (never reused).
+    """
+    hashes = tuple(
+        sources.get(key, {}).get("sha256") for key in ("rare_schedule", "wine_list")
+    )
+    if None in hashes:
+        return None
+    return hashes + (MATCHER_FINGERPRINT,)
+
+
+def build_price_table(all_data):
+    """
+    Resolves the price match of every distinct rare schedule name once.
+
+    Returns:
+        dict: Rare wine name -> PriceMatch, or None when no price was found.
+    """
+    wine_details = all_data.get("wine_details", {})
+    house_names = all_data.get("house_names", set())
+    house_price_maps = build_house_price_maps(wine_details, house_names)
+    house_trie = all_data.get("house_trie")
+    if house_trie is None:
+        house_trie = build_house_trie(house_names)
+
+    price_table = {}
+    for item in all_data.get("rare_schedule", []):
+        name = item.get("name")
+        if name and name not in price_table:
+            price_table[name] = match_price_for_rare_wine(
+                name, wine_details, house_names, house_price_maps, house_trie
+            )
+    return price_table
+
+
 # --- Helper function to extract year ---
 def extract_year_from_name(name):
     """Extracts a 4-digit year from a string, returning None if not found."""
@@ -261,18 +440,284 @@ def extract_year_from_name(name):
     return None
 
 
+# --- Precomputed Opening Index ---
+# Sizes recognized for scoring, checked in this order
+SIZE_PATTERNS = {
+    size: re.compile(r"\b" + size + r"\b")
+    for size in ("magnum", "jeroboam", "methuselah", "nabuchodonosor")
+}
+
+# One rare-schedule entry with every request-independent feature resolved.
+# Tuples are immutable, so concurrent requests can share the index safely.
+Opening = namedtuple(
+    "Opening",
+    [
+        "datetime",
+        "date",
+        "time",
+        "name",
+        "stand",
+        "house",
+        "size",
+        "vintage_year",
+        "normalized_name",
+        "glass_price",
+    ],
+)
+
+# The index: Opening tuples sorted by datetime (schedule order kept for ties),
+# their datetimes in a parallel tuple for binary search, and the scoring
+# features as read-only NumPy columns (one row per opening) so filtering and
+# scoring run as vectorized masks:
+#   time_us       int64   opening time, microseconds since the epoch (naive)
+#   house_ids     int32   index into house_vocab, -1 if no house matched
+#   size_codes    int8    index into SIZE_CODES, -1 for regular bottles
+#   vintage_years int32   vintage year, 0 if the name has none
+#   glass_prices  float64 glass price in euros, NaN if unknown
+#   name_ids      int32   index into name_vocab (normalized names)
+#   stand_ids     int16   row of walk_seconds for the stand, -1 if not on the map
+# walk_seconds is the all-pairs walking-time matrix (None without a stand map).
+OpeningIndex = namedtuple(
+    "OpeningIndex",
+    [
+        "openings",
+        "times",
+        "time_us",
+        "house_ids",
+        "size_codes",
+        "vintage_years",
+        "glass_prices",
+        "name_ids",
+        "stand_ids",
+        "house_vocab",
+        "name_vocab",
+        "stand_vocab",
+        "walk_seconds",
+    ],
+)
+SIZE_CODES = {size: code for code, size in enumerate(SIZE_PATTERNS)}
+
+
+def _datetime_to_us(value):
+    """Converts a naive datetime to the int64 microsecond scale of time_us."""
+    return np.datetime64(value, "us").astype(np.int64)
+
+
+def _read_only(array):
+    array.flags.writeable = False
+    return array
+
+
+def _parse_price(price):
+    try:
+        return float(str(price).replace(",", "."))
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def build_opening_index(all_data):
+    """
+    Resolves datetime, house, size, vintage year, normalized name and glass
+    price for every rare schedule entry once, at load time.
+
+    Returns:
+        OpeningIndex: The time-sorted openings and their datetimes.
+    """
+    rare_schedule = all_data.get("rare_schedule", [])
+    house_trie = all_data.get("house_trie")
+    if house_trie is None:
+        house_trie = build_house_trie(all_data.get("house_names", set()))
+    price_table = all_data.get("price_table")
+    if price_table is None:
+        price_table = build_price_table(all_data)
+
+    openings = []
+    for item in rare_schedule:
+        try:
+            # Combine date and time strings and parse into datetime
+            opening_time = datetime.strptime(
+                f"{item['date']} {item['time']}", "%Y-%m-%d %H:%M"
+            )
+        except (KeyError, ValueError) as e:
+            print(
+                f"Warning: Skipping schedule item due to missing/invalid date/time: {item}. Error: {e}",
+                file=sys.stderr,
+            )
+            continue
+
+        name = item.get("name", "")
+        name_lower = name.lower()
+        opening_house = match_house(house_trie, name)
+
+        opening_size = None
+        for size_key, pattern in SIZE_PATTERNS.items():
+            if pattern.search(name_lower):
+                opening_size = size_key
+                break
+
+        openings.append(
+            Opening(
+                datetime=opening_time,
+                date=item["date"],
+                time=item["time"],
+                name=name,
+                stand=item.get("stand"),
+                house=opening_house,
+                size=opening_size,
+                vintage_year=extract_year_from_name(name),
+                normalized_name=normalize_name(name),
+                glass_price=price_table[name].glass_price if price_table.get(name) else None,
+            )
+        )
+
+    openings.sort(key=lambda opening: opening.datetime)
+
+    walking_model = all_data.get("walking_model")
+    stand_vocab = dict(walking_model.stand_ids) if walking_model else {}
+    house_vocab = {}
+    name_vocab = {}
+    for opening in openings:
+        if opening.house is not None:
+            house_vocab.setdefault(opening.house, len(house_vocab))
+        name_vocab.setdefault(opening.normalized_name, len(name_vocab))
+
+    return OpeningIndex(
+        openings=tuple(openings),
+        times=tuple(opening.datetime for opening in openings),
+        time_us=_read_only(
+            np.array([o.datetime for o in openings], dtype="datetime64[us]").astype(
+                np.int64
+            )
+        ),
+        house_ids=_read_only(
+            np.array(
+                [house_vocab.get(o.house, -1) for o in openings], dtype=np.int32
+            )
+        ),
+        size_codes=_read_only(
+            np.array([SIZE_CODES.get(o.size, -1) for o in openings], dtype=np.int8)
+        ),
+        vintage_years=_read_only(
+            np.array([o.vintage_year or 0 for o in openings], dtype=np.int32)
+        ),
+        glass_prices=_read_only(
+            np.array([_parse_price(o.glass_price) for o in openings], dtype=np.float64)
+        ),
+        name_ids=_read_only(
+            np.array([name_vocab[o.normalized_name] for o in openings], dtype=np.int32)
+        ),
+        stand_ids=_read_only(
+            np.array([stand_vocab.get(o.stand, -1) for o in openings], dtype=np.int16)
+        ),
+        house_vocab=MappingProxyType(house_vocab),
+        name_vocab=MappingProxyType(name_vocab),
+        stand_vocab=MappingProxyType(stand_vocab),
+        walk_seconds=walking_model.seconds if walking_model else None,
+    )
+
+
+def next_opening_boundary(opening_index, current_time):
+    """
+    Returns the start time of the first opening after current_time, or None.
+    Results computed at current_time stay valid until that moment passes.
+    """
+    start = bisect_right(opening_index.times, current_time)
+    return opening_index.times[start] if start < len(opening_index.times) else None
+
+
 # --- Core Filtering/Ranking Logic ---
-def find_next_rare_opening(all_data, current_time=None, dynamic_preferences=None):
-    """Finds the next available rare opening based on schedule and preferences."""
+DEFAULT_RESULT_LIMIT = 4  # Recommendations returned when the caller does not ask for k
+# Result orderings: "time" = soonest first, higher score first within the same
+# time; "score" = highest score first, soonest first within the same score.
+RESULT_ORDERS = ("time", "score")
+RANK_CHUNK_SIZE = 64  # Openings scored per step while streaming in time order
+RECOMMENDATION_MIN_SCORE = 2  # Preference score an opening needs to be recommended
+
+
+def find_next_rare_opening(
+    all_data,
+    current_time=None,
+    dynamic_preferences=None,
+    limit=DEFAULT_RESULT_LIMIT,
+    order="time",
+):
+    """
+    Finds the next available rare opening(s) based on schedule and preferences.
+
+    Returns:
+        list: Up to `limit` opening dicts (with 'preference_score'), in `order`.
+    """
     if current_time is None:
         current_time = datetime.now()
     print(f"Finding next opening based on current time: {current_time}")
 
-    rare_schedule = all_data.get("rare_schedule", [])
-    wine_details = all_data.get("wine_details", {})
-    house_names = all_data.get("house_names", set())
+    opening_index = all_data.get("opening_index")
+    if opening_index is None:
+        opening_index = build_opening_index(all_data)
+
+    return _rank_openings(
+        opening_index,
+        bisect_right(opening_index.times, current_time),
+        all_data.get("preferences", {}),
+        dynamic_preferences,
+        limit,
+        order,
+        current_time,
+    )
+
+
+def find_next_rare_openings_batch(
+    all_data,
+    current_time,
+    dynamic_preferences_list,
+    limit=DEFAULT_RESULT_LIMIT,
+    order="time",
+):
+    """
+    Runs find_next_rare_opening for many preference sets at once. The future
+    time window is located once and shared; house, size, vintage and price
+    come precomputed from the opening index columns.
+
+    Returns:
+        list: One result list per entry of dynamic_preferences_list, in order.
+    """
+    opening_index = all_data.get("opening_index")
+    if opening_index is None:
+        opening_index = build_opening_index(all_data)
     base_preferences = all_data.get("preferences", {})
 
+    start = bisect_right(opening_index.times, current_time)
+    return [
+        _rank_openings(
+            opening_index,
+            start,
+            base_preferences,
+            dynamic_preferences,
+            limit,
+            order,
+            current_time,
+        )
+        for dynamic_preferences in dynamic_preferences_list
+    ]
+
+
+def _opening_scorer(
+    opening_index,
+    base_preferences,
+    dynamic_preferences,
+    min_score=RECOMMENDATION_MIN_SCORE,
+    current_time=None,
+):
+    """
+    Prepares one preference set for scoring against the opening index.
+    With a 'current_stand' preference and current_time, openings that cannot
+    be reached on foot before they start are filtered out as well.
+
+    Returns:
+        function: score_rows(lo, hi) -> (positions, scores) of the openings in
+                  index rows [lo, hi) that pass the schedule and exclusion
+                  filters and score at least min_score, as NumPy arrays.
+    """
     # Create effective preferences for THIS request, starting with base
     effective_preferences = base_preferences.copy()
     if dynamic_preferences:
@@ -287,139 +732,338 @@ def find_next_rare_opening(all_data, current_time=None, dynamic_preferences=None
     dynamically_excluded = set(effective_preferences.get("excluded_wines", []))
     # Only add the dynamically excluded (MC) wines if the flag is False
     if dynamically_excluded and not ignore_tasted_flag_from_prefs:
-        normalized_dynamic_excluded = {
-            normalize_name(wine) for wine in dynamically_excluded
-        }
-        final_excluded_wines.update(normalized_dynamic_excluded)
+        final_excluded_wines.update(normalize_names(dynamically_excluded))
+    # Same, for callers that already hold normalized names (precomputed MC wine sets)
+    if not ignore_tasted_flag_from_prefs:
+        final_excluded_wines.update(
+            effective_preferences.get("excluded_normalized_wines", ())
+        )
 
     # -------------------------------------------- #
 
-    # --- Pre-process schedule: Add datetime objects --- #
-    processed_schedule = []
-    for item in rare_schedule:
-        try:
-            # Combine date and time strings and parse into datetime
-            opening_time = datetime.strptime(
-                f"{item['date']} {item['time']}", "%Y-%m-%d %H:%M"
-            )
-            item["datetime"] = opening_time  # Add the datetime object
-            processed_schedule.append(item)
-        except (KeyError, ValueError) as e:
-            print(
-                f"Warning: Skipping schedule item due to missing/invalid date/time: {item}. Error: {e}",
-                file=sys.stderr,
-            )
-            continue
-    # ------------------------------------------------- #
-
-    # --- Filtering Logic --- #
-    possible_openings = []
-    # Get MC slots from effective preferences, default to empty list
-    attended_mc_slots = effective_preferences.get("attended_mc_slots", [])
-
-    # Filter PROCESSED schedule for future openings
-    for opening in processed_schedule:
-        opening_time = opening["datetime"]  # Now this key exists
-        if opening_time > current_time:
-            # Check ONLY against attended MC slots for time conflicts
-            is_free = True
-            if attended_mc_slots:
-                for mc_slot in attended_mc_slots:
-                    if mc_slot["start"] <= opening_time < mc_slot["end"]:
-                        is_free = False
-                        # print(f"DEBUG: {opening['name']} conflicts with MC slot {mc_slot}") # Optional debug
-                        break
-
-            if is_free:
-                # Normalize wine name from schedule for exclusion check
-                normalized_opening_name = normalize_name(opening.get("name"))
-                # Check if excluded (now only based on selected MCs + ignore_tasted flag)
-                if normalized_opening_name not in final_excluded_wines:
-                    possible_openings.append(opening)
-
-    if not possible_openings:
-        print(
-            "No future rare openings available or free after schedule/tasting/exclusion checks."
+    # --- Filtering Inputs --- #
+    # Attended MC (start, end) slots, merged into sorted non-overlapping
+    # intervals; each opening is located among them by binary search
+    busy = merge_intervals(effective_preferences.get("attended_mc_slots", []))
+    busy_starts = np.array([_datetime_to_us(t) for t in busy.starts], dtype=np.int64)
+    busy_ends = np.array([_datetime_to_us(t) for t in busy.ends], dtype=np.int64)
+
+    # Excluded (now only based on selected MCs + ignore_tasted flag)
+    excluded_ids = [
+        opening_index.name_vocab[name]
+        for name in final_excluded_wines
+        if name in opening_index.name_vocab
+    ]
+
+    # --- Preference Inputs --- #
+    pref_house_ids = [
+        opening_index.house_vocab[house]
+        for house in effective_preferences.get("houses") or ()
+        if house in opening_index.house_vocab
+    ]
+    pref_size_codes = [
+        SIZE_CODES[size]
+        for size in effective_preferences.get("sizes") or ()
+        if size in SIZE_CODES
+    ]
+    pref_older_than_year = effective_preferences.get("older_than_year")
+
+    # --- Reachability Inputs --- #
+    # Walking time from the current stand to every mapped stand (one matrix row)
+    walk_us_from_here = _walk_us_from(
+        opening_index, effective_preferences.get("current_stand")
+    )
+    if current_time is None:
+        walk_us_from_here = None
+    else:
+        now_us = _datetime_to_us(current_time)
+
+    def score_rows(lo, hi):
+        time_us = opening_index.time_us[lo:hi]
+        keep = np.ones(hi - lo, dtype=bool)
+        if len(busy_starts):
+            interval = np.searchsorted(busy_starts, time_us, side="right") - 1
+            keep &= ~((interval >= 0) & (time_us < busy_ends[np.maximum(interval, 0)]))
+        if excluded_ids:
+            keep &= ~np.isin(opening_index.name_ids[lo:hi], excluded_ids)
+        if walk_us_from_here is not None:
+            # Stands not on the map (id -1) are assumed reachable
+            stand_ids = opening_index.stand_ids[lo:hi]
+            walk_us = np.where(stand_ids >= 0, walk_us_from_here[stand_ids], 0)
+            keep &= time_us - now_us >= walk_us
+
+        scores = np.zeros(hi - lo, dtype=np.int8)
+        # 1. House Preference (+1)
+        if pref_house_ids:
+            scores += np.isin(opening_index.house_ids[lo:hi], pref_house_ids)
+        # 2. Size Preference (+1)
+        if pref_size_codes:
+            scores += np.isin(opening_index.size_codes[lo:hi], pref_size_codes)
+        # 3. Age Preference (+1)
+        if pref_older_than_year:
+            vintage_years = opening_index.vintage_years[lo:hi]
+            scores += (vintage_years > 0) & (vintage_years <= pref_older_than_year)
+
+        selected = np.flatnonzero(keep & (scores >= min_score))
+        return selected + lo, scores[selected]
+
+    return score_rows
+
+
+def _walk_us_from(opening_index, stand):
+    """
+    Returns the walking times in microseconds from `stand` to every stand row
+    of the index's walking matrix, or None without a map or an unknown stand.
+    """
+    if opening_index.walk_seconds is None or stand is None:
+        return None
+    row = opening_index.stand_vocab.get(str(stand))
+    if row is None:
+        return None
+    return (opening_index.walk_seconds[row] * 1_000_000).astype(np.int64)
+
+
+def next_reachability_change(opening_index, current_time, current_stand):
+    """
+    Returns the first moment after current_time at which a future opening
+    stops being reachable on foot from current_stand (its start time minus
+    the walking time), or None. Results filtered by reachability stay valid
+    until then.
+    """
+    walk_us_from_here = _walk_us_from(opening_index, current_stand)
+    if walk_us_from_here is None:
+        return None
+    start = bisect_right(opening_index.times, current_time)
+    stand_ids = opening_index.stand_ids[start:]
+    walk_us = np.where(stand_ids >= 0, walk_us_from_here[stand_ids], 0)
+    leave_by_us = opening_index.time_us[start:] - walk_us
+    leave_by_us = leave_by_us[leave_by_us > _datetime_to_us(current_time)]
+    if not len(leave_by_us):
+        return None
+    return datetime(1970, 1, 1) + timedelta(microseconds=int(leave_by_us.min()))
+
+
+def _rank_openings(
+    opening_index,
+    start,
+    base_preferences,
+    dynamic_preferences,
+    limit,
+    order,
+    current_time=None,
+):
+    """
+    Filters and scores the openings from position `start` of the index on
+    for one preference set, as vectorized masks over the index columns, and
+    selects the top `limit` of them without sorting the whole window.
+    """
+    if order not in RESULT_ORDERS:
+        raise ValueError(f"Unknown result order '{order}'")
+
+    end = len(opening_index.openings)
+    if start >= end or limit <= 0:
+        print("No future rare openings available.")
+        return []
+
+    score_rows = _opening_scorer(
+        opening_index, base_preferences, dynamic_preferences, current_time=current_time
+    )
+
+    # --- Select Top k --- #
+    if order == "time":
+        # The index is time-ordered, so score it chunk by chunk and stop once
+        # `limit` openings qualify and the time of the k-th one is complete
+        # (later rows at that same time could still outrank it by score).
+        chunks = []
+        found = 0
+        cutoff_us = None
+        lo = start
+        while lo < end:
+            hi = min(lo + max(RANK_CHUNK_SIZE, limit), end)
+            positions, scores = score_rows(lo, hi)
+            chunks.append((positions, scores))
+            found += len(positions)
+            if found >= limit and cutoff_us is None:
+                all_positions = np.concatenate([p for p, _ in chunks])
+                cutoff_us = opening_index.time_us[all_positions[limit - 1]]
+            if cutoff_us is not None and opening_index.time_us[hi - 1] > cutoff_us:
+                break
+            lo = hi
+        positions = np.concatenate([p for p, _ in chunks])
+        scores = np.concatenate([s for _, s in chunks])
+        # Only the prefix up to the cut-off time needs ordering; lexsort is
+        # stable, so equal (time, score) rows keep schedule order
+        if cutoff_us is not None:
+            in_prefix = opening_index.time_us[positions] <= cutoff_us
+            positions, scores = positions[in_prefix], scores[in_prefix]
+        ranked = np.lexsort((-scores, opening_index.time_us[positions]))[:limit]
+        top = [(positions[i], scores[i]) for i in ranked]
+    else:
+        # Best scores can be anywhere in the window: score it all, then keep k
+        # with a heap (position breaks ties, i.e. earlier opening first)
+        positions, scores = score_rows(start, end)
+        top = heapq.nsmallest(
+            limit, zip(positions, scores), key=lambda row: (-row[1], row[0])
         )
+
+    if not top:
+        print("No future rare openings available after schedule/exclusion/preference checks.")
         return []
 
-    # --- Apply Preferences and Score --- #
+    # Return fresh dicts; the shared index is never modified
     scored_openings = []
-    for opening in possible_openings:
-        preference_score = 0
-        opening_house = None
-        opening_name_lower = opening.get("name", "").lower()
-
-        # Find house (consider caching or pre-processing this)
-        for house in house_names:
-            house_lower = house.lower()
-            if opening_name_lower.startswith(house_lower) and (
-                len(opening.get("name", "")) == len(house)
-                or not opening_name_lower[len(house)].isalnum()
-            ):
-                opening_house = house
-                break
-        opening["house"] = opening_house
+    for position, score in top:
+        result = opening_index.openings[position]._asdict()
+        result["preference_score"] = int(score)
+        scored_openings.append(result)
+    return scored_openings
 
-        # Extract size from name for scoring
-        opening_size = None
-        size_patterns = {
-            "magnum": ["magnum"],
-            "jeroboam": ["jeroboam"],
-            "methuselah": ["methuselah"],
-            "nabuchodonosor": ["nabuchodonosor"],  # Key is now lowercase
-        }  # Define sizes recognized for scoring
-        for size_key, patterns in size_patterns.items():
-            for pattern in patterns:
-                # Use regex word boundary search for robustness
-                if re.search(r"\b" + pattern + r"\b", opening_name_lower):
-                    opening_size = size_key
-                    break
-            if opening_size:
-                break
 
-        # --- Use effective_preferences for scoring --- #
+# --- Itinerary Planning ---
+DEFAULT_VISIT_MINUTES = 15  # Time per opening: at the stand and walking on to the next
 
-        # 1. House Preference (+1)
-        pref_houses = effective_preferences.get(
-            "houses", []
-        )  # Use effective_preferences
-        if pref_houses and opening_house and opening_house in pref_houses:
-            preference_score += 1
-            # print(f"DEBUG Score: +1 House match ({opening_house}) for '{opening['name']}'")
 
-        # 2. Size Preference (+1)
-        pref_sizes = effective_preferences.get("sizes", [])  # Use effective_preferences
-        if pref_sizes and opening_size and opening_size in pref_sizes:
-            preference_score += 1
-            # print(f"DEBUG Score: +1 Size match ({opening_size}) for '{opening['name']}'")
+def plan_itinerary(
+    all_data,
+    current_time=None,
+    dynamic_preferences=None,
+    visit_minutes=DEFAULT_VISIT_MINUTES,
+    min_score=1,
+    include_walking=True,
+):
+    """
+    Plans a conflict-free itinerary for the rest of the festival: the set of
+    future openings with the highest total preference score such that each
+    visit (opening time + visit_minutes) ends before the next one starts.
+    Openings during attended master classes or of already tasted wines are
+    left out, as in find_next_rare_opening.
+
+    With a stand map and include_walking, the walk to the next stand is part
+    of a visit's time: back-to-back visits are fine while the walk fits in
+    visit_minutes, and only a longer walk delays the next possible visit. A
+    'current_stand' preference drops openings that cannot be reached in time
+    from where you are now.
+
+    Returns:
+        dict: {'openings': list of opening dicts (with 'preference_score') in
+               time order, 'total_score': int}.
+    """
+    if visit_minutes <= 0:
+        raise ValueError("visit_minutes must be positive")
+    if current_time is None:
+        current_time = datetime.now()
 
-        # 3. Age Preference (+1)
-        pref_older_than_year = effective_preferences.get(
-            "older_than_year"
-        )  # Use effective_preferences
-        if pref_older_than_year:
-            extracted_year = extract_year_from_name(opening.get("name"))
-            if extracted_year and extracted_year <= pref_older_than_year:
-                preference_score += 1
-                # print(f"DEBUG Score: +1 Age match ({extracted_year} <= {pref_older_than_year}) for '{opening['name']}'")
-        # -------------------------------------------- #
-
-        # Add glass price info
-        opening["glass_price"] = find_price_for_rare_wine(
-            opening.get("name"), wine_details, house_names
+    opening_index = all_data.get("opening_index")
+    if opening_index is None:
+        opening_index = build_opening_index(all_data)
+
+    start = bisect_right(opening_index.times, current_time)
+    score_rows = _opening_scorer(
+        opening_index,
+        all_data.get("preferences", {}),
+        dynamic_preferences,
+        min_score=max(min_score, 1),  # Zero-score visits never add to the total
+        current_time=current_time if include_walking else None,
+    )
+    positions, scores = score_rows(start, len(opening_index.openings))
+    if not len(positions):
+        return {"openings": [], "total_score": 0}
+
+    starts_us = opening_index.time_us[positions]
+    ends_us = starts_us + int(visit_minutes) * 60 * 1_000_000
+    weights = scores.tolist()
+    if include_walking and opening_index.walk_seconds is not None:
+        chosen, total_score = _schedule_with_walking(
+            starts_us,
+            ends_us,
+            weights,
+            opening_index.stand_ids[positions],
+            opening_index.walk_seconds,
         )
-        opening["preference_score"] = preference_score
+    else:
+        chosen, total_score = _schedule_fixed_visits(starts_us, ends_us, weights)
+
+    itinerary = []
+    for candidate in chosen:
+        result = opening_index.openings[positions[candidate]]._asdict()
+        result["preference_score"] = int(scores[candidate])
+        itinerary.append(result)
+    return {"openings": itinerary, "total_score": total_score}
+
 
-        if preference_score >= 2:
-            scored_openings.append(opening)
+def _schedule_fixed_visits(starts_us, ends_us, weights):
+    """
+    Weighted interval scheduling over time-sorted visits of equal length.
+    Visit end times are then sorted as well, so each visit's latest
+    compatible predecessor is found by one vectorized binary search: O(n log n).
+
+    Returns:
+        tuple: (chosen candidate positions in time order, total weight).
+    """
+    # predecessor[i]: number of candidates whose visit ends by the time i
+    # starts, i.e. DP state to extend with i (0 = nothing before it)
+    predecessor = np.searchsorted(ends_us, starts_us, side="right").tolist()
+
+    # best[i]: highest total over the first i candidates
+    best = [0] * (len(weights) + 1)
+    for i, weight in enumerate(weights):
+        best[i + 1] = max(best[i], best[predecessor[i]] + weight)
+
+    # Walk back through the table; on ties the later opening is left out, so
+    # of equally good itineraries the one with earlier openings is returned
+    chosen = []
+    i = len(weights)
+    while i > 0:
+        if best[i] == best[i - 1]:
+            i -= 1
+        else:
+            chosen.append(i - 1)
+            i = predecessor[i - 1]
+    chosen.reverse()
+    return chosen, best[-1]
 
-    # --- Sort Results --- #
-    # Sort primarily by datetime (ascending), secondarily by score (descending)
-    scored_openings.sort(key=lambda x: (x["datetime"], -x["preference_score"]))
 
-    # Return top 4
-    return scored_openings[:4]
+def _schedule_with_walking(starts_us, ends_us, weights, stand_ids, walk_seconds):
+    """
+    Weighted interval scheduling where visit j can precede visit i only if
+    j has ended and the walk from j's stand (started at j's opening, so it
+    overlaps the visit) reaches i's stand before i starts. Compatibility now
+    depends on the pair, so the DP keeps the best itinerary ending at each
+    visit and checks all earlier visits for it in one vectorized step: O(n^2).
+
+    Returns:
+        tuple: (chosen candidate positions in time order, total weight).
+    """
+    # Pairwise walking times between the candidates' stands (unmapped: 0)
+    mapped = stand_ids >= 0
+    rows = np.where(mapped, stand_ids, 0)
+    walk_us = (walk_seconds[np.ix_(rows, rows)] * 1_000_000).astype(np.int64)
+    walk_us[~mapped, :] = 0
+    walk_us[:, ~mapped] = 0
+
+    # best_ending[i]: highest total of an itinerary whose last visit is i
+    best_ending = np.zeros(len(weights), dtype=np.int64)
+    previous = [-1] * len(weights)
+    for i, weight in enumerate(weights):
+        # The walk counts toward the visit time; only the part of a walk
+        # longer than the visit delays the next one
+        free_at_us = np.maximum(ends_us[:i], starts_us[:i] + walk_us[:i, i])
+        reachable = free_at_us <= starts_us[i]
+        best_ending[i] = weight
+        if reachable.any():
+            # argmax takes the first maximum, i.e. the earliest predecessor
+            j = int(np.argmax(np.where(reachable, best_ending[:i], -1)))
+            best_ending[i] += best_ending[j]
+            previous[i] = j
+
+    chosen = []
+    i = int(np.argmax(best_ending))
+    total = int(best_ending[i])
+    while i >= 0:
+        chosen.append(i)
+        i = previous[i]
+    chosen.reverse()
+    return chosen, total
 
 
 if __name__ == "__main__":
@@ -1,8 +1,18 @@
-import pdfplumber
+import hashlib
+import json
+import multiprocessing
+import os
 import re
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
+from itertools import repeat
 import sys  # Added for stderr printing
 
+# pdfplumber (and pdfminer under it) is imported inside the functions that read
+# PDFs: it is the slowest import of the app, and workers starting from an
+# up-to-date snapshot never need it.
+
 # Regex to find date headers like "THURSDAY 24.4." and capture the date part
 DATE_HEADER_PATTERN = re.compile(
     r"(?:TORSTAI|THURSDAY|PERJANTAI|FRIDAY|LAUANTAI|SATURDAY)\s+(\d{1,2}\.\d{1,2}\.)",
@@ -14,122 +24,323 @@ SCHEDULE_LINE_PATTERN = re.compile(r"^(\d{1,2}:\d{2})\s+(.+?)\s+(\d+)$")
 YEAR = "2025"
 # --- DEBUG FLAG ---
 DEBUG = False  # Set to False to turn off debug prints
+# Processes extracting PDF page text in parallel (1 = sequential, in this process)
+PDF_WORKERS = os.cpu_count() or 1
+# Workers are spawned, not forked: a fork of a threaded process (a gunicorn
+# worker with its refresher and scheduler threads) can inherit held locks.
+PDF_WORKER_CONTEXT = "spawn"
+# Extracted page text is cached per PDF in this directory next to it
+PAGE_TEXT_CACHE_DIR = "page_text_cache"
+# Bump when the cache layout or page hashing changes; the pdfplumber version is
+# part of the key too, since extraction results can differ between releases
+PAGE_TEXT_CACHE_VERSION = 1
+
+
+class PDFParseError(Exception):
+    """An input PDF exists but could not be parsed, or yielded no entries."""
+
+
+# --- Page Text Extraction --- #
+def _feed_pdf_object(digest, obj, seen):
+    """
+    Feeds a canonical serialization of a PDF object (following references)
+    into a hash. Indirect objects are numbered in order of first visit
+    rather than by object id, so a republished file whose objects were
+    renumbered still hashes the same.
+    """
+    from pdfminer.pdftypes import PDFObjRef, PDFStream
+    from pdfminer.psparser import PSKeyword, PSLiteral
+
+    if isinstance(obj, PDFObjRef):
+        if obj.objid in seen:
+            digest.update(b"R%d;" % seen[obj.objid])
+            return
+        seen[obj.objid] = len(seen)
+        obj = obj.resolve()
+    if isinstance(obj, PDFStream):
+        digest.update(b"S")
+        _feed_pdf_object(digest, obj.attrs, seen)
+        data = obj.get_rawdata()
+        if data is None:  # Already decoded
+            data = obj.get_data()
+        digest.update(b"%d:" % len(data))
+        digest.update(data)
+    elif isinstance(obj, dict):
+        digest.update(b"{")
+        for key in sorted(obj):
+            digest.update(repr(key).encode())
+            _feed_pdf_object(digest, obj[key], seen)
+        digest.update(b"}")
+    elif isinstance(obj, (list, tuple)):
+        digest.update(b"[")
+        for item in obj:
+            _feed_pdf_object(digest, item, seen)
+        digest.update(b"]")
+    elif isinstance(obj, (PSLiteral, PSKeyword)):
+        digest.update(b"/" + repr(obj.name).encode())
+    else:
+        digest.update(repr(obj).encode() + b";")
+
+
+def page_content_hash(page, extract_kwargs):
+    """
+    Hash of everything page.extract_text(**extract_kwargs) depends on: the
+    page's content streams, its resources (fonts with their encodings and
+    ToUnicode maps, XObjects, ...), its boxes and rotation, and the
+    extraction options.
+    """
+    page_obj = page.page_obj
+    digest = hashlib.sha256()
+    seen = {}
+    for part in (
+        page_obj.contents,
+        page_obj.resources,
+        page_obj.mediabox,
+        page_obj.cropbox,
+        page_obj.rotate,
+        sorted(extract_kwargs.items()),
+    ):
+        _feed_pdf_object(digest, part, seen)
+    return digest.hexdigest()
+
+
+def _page_text_cache_path(pdf_path):
+    directory, filename = os.path.split(os.path.abspath(pdf_path))
+    return os.path.join(directory, PAGE_TEXT_CACHE_DIR, f"{filename}.json")
+
+
+def _page_text_cache_key():
+    import pdfplumber
+
+    return f"{PAGE_TEXT_CACHE_VERSION}:pdfplumber-{pdfplumber.__version__}"
+
+
+def load_page_text_cache(cache_path):
+    """
+    Reads the page text cache of one PDF.
 
+    Returns:
+        dict: {page content hash: text}, empty if missing, unreadable or stale.
+    """
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            cache = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        print(f"Warning: Ignoring unreadable page text cache {cache_path}: {e}", file=sys.stderr)
+        return {}
+    if not isinstance(cache, dict) or cache.get("extractor") != _page_text_cache_key():
+        return {}
+    return cache.get("pages", {})
+
+
+def save_page_text_cache(cache_path, pages):
+    """Atomically writes the page text cache of one PDF ({page content hash: text})."""
+    directory = os.path.dirname(cache_path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".pages-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"extractor": _page_text_cache_key(), "pages": pages}, f, ensure_ascii=False)
+        os.chmod(tmp_path, 0o644)  # mkstemp creates owner-only files
+        os.replace(tmp_path, cache_path)
+    except Exception:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _extract_pages(pdf_path, page_indexes, extract_kwargs):
+    """Extracts the text of the given pages; runs in a worker process."""
+    import pdfplumber
+
+    with pdfplumber.open(pdf_path) as pdf:
+        return [pdf.pages[i].extract_text(**extract_kwargs) for i in page_indexes]
+
+
+def extract_page_texts(pdf_path, workers=None, use_cache=True, **extract_kwargs):
+    """
+    Extracts the text of every page of a PDF with page.extract_text(**extract_kwargs).
+
+    Pages whose content hash (see page_content_hash) is in the PDF's page text
+    cache are not extracted again, so a republished file with a one-page
+    correction only re-extracts that page.
+
+    With more than one worker, the pages to extract are split into contiguous
+    runs that worker processes extract independently (each opens the PDF
+    itself), and the texts are put back in page order. Context carried across
+    pages (dates, stands, houses) is then applied by the caller walking the
+    texts in order, so the parse result is identical to the sequential one.
 
-def parse_rare_schedule(pdf_path="Material/Rare_schedule_2025.pdf"):
+    Returns:
+        list: The text of each page in page order (None for pages without text).
+    """
+    import pdfplumber
+
+    workers = PDF_WORKERS if workers is None else workers
+    cache_path = _page_text_cache_path(pdf_path)
+    cached = {}
+    page_hashes = None
+    texts = {}  # Page index -> text
+    with pdfplumber.open(pdf_path) as pdf:
+        page_count = len(pdf.pages)
+        if use_cache:
+            try:
+                page_hashes = [page_content_hash(page, extract_kwargs) for page in pdf.pages]
+            except Exception as e:
+                print(f"Warning: Could not hash pages of {pdf_path}, not caching: {e}", file=sys.stderr)
+            else:
+                cached = load_page_text_cache(cache_path)
+                texts = {i: cached[h] for i, h in enumerate(page_hashes) if h in cached}
+        missing = [i for i in range(page_count) if i not in texts]
+        if workers <= 1 or len(missing) <= 1:
+            for i in missing:
+                texts[i] = pdf.pages[i].extract_text(**extract_kwargs)
+            missing = []
+
+    if missing:
+        workers = min(workers, len(missing))
+        runs = [
+            missing[len(missing) * w // workers : len(missing) * (w + 1) // workers]
+            for w in range(workers)
+        ]
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context(PDF_WORKER_CONTEXT)
+        ) as pool:
+            for run, run_texts in zip(
+                runs, pool.map(_extract_pages, repeat(pdf_path), runs, repeat(extract_kwargs))
+            ):
+                texts.update(zip(run, run_texts))
+
+    if page_hashes is not None:
+        pages = {h: texts[i] for i, h in enumerate(page_hashes)}
+        if pages != cached:  # Also drops the pages of earlier versions of the file
+            try:
+                save_page_text_cache(cache_path, pages)
+            except OSError as e:
+                print(f"Warning: Could not write page text cache {cache_path}: {e}", file=sys.stderr)
+    return [texts[i] for i in range(page_count)]
+
+
+def parse_rare_schedule(pdf_path="Material/Rare_schedule_2025.pdf", workers=None):
     """
     Parses the Rare Schedule PDF to extract opening dates, times, champagne names, and stand numbers.
+    Page text is extracted on `workers` processes (default PDF_WORKERS).
 
     Returns:
         list: A list of dictionaries, each containing 'date' (str, YYYY-MM-DD),
               'time' (str, HH:MM), 'name' (str), and 'stand' (str).
-              Returns an empty list if parsing fails or PDF not found.
+              Returns an empty list if the PDF is not found.
+
+    Raises:
+        PDFParseError: If the PDF exists but could not be parsed or has no entries.
     """
     schedule = []
     current_date_str = None  # Store as DD.MM. initially
-    page_num = 0
 
     try:
-        with pdfplumber.open(pdf_path) as pdf:
-            for page in pdf.pages:
-                page_num += 1
+        page_texts = extract_page_texts(
+            pdf_path, workers, x_tolerance=2, y_tolerance=2
+        )  # Adjust tolerance slightly if needed
+        # The date header carries over page breaks, so pages are walked in order
+        for page_num, text in enumerate(page_texts, 1):
+            if DEBUG:
+                print(f"\n--- Processing Page {page_num} ---", file=sys.stderr)
+            if not text:
                 if DEBUG:
-                    print(f"\n--- Processing Page {page_num} ---", file=sys.stderr)
-                text = page.extract_text(
-                    x_tolerance=2, y_tolerance=2
-                )  # Adjust tolerance slightly if needed
-                if not text:
-                    if DEBUG:
-                        print(f"Page {page_num}: No text extracted.", file=sys.stderr)
+                    print(f"Page {page_num}: No text extracted.", file=sys.stderr)
+                continue
+
+            lines = text.split("\n")
+            line_num = 0
+            for line in lines:
+                line_num += 1
+                line = line.strip()
+                if not line:
                     continue
 
-                lines = text.split("\n")
-                line_num = 0
-                for line in lines:
-                    line_num += 1
-                    line = line.strip()
-                    if not line:
-                        continue
+                if DEBUG:
+                    print(
+                        f"Page {page_num}, Line {line_num}: Raw='{line}'",
+                        file=sys.stderr,
+                    )
 
+                # Check for Date Header
+                date_match = DATE_HEADER_PATTERN.search(line)
+                if date_match:
+                    day_month = date_match.group(1).replace(
+                        ".", ""
+                    )  # Get "244" from "24.4."
                     if DEBUG:
                         print(
-                            f"Page {page_num}, Line {line_num}: Raw='{line}'",
+                            f"  DEBUG: Date header FOUND: '{line}', extracted day_month: '{day_month}'",
+                            file=sys.stderr,
+                        )
+                    # Reformat to DD.MM
+                    if len(day_month) == 3:  # e.g., 244 -> 24.04
+                        current_date_str = f"{day_month[0:2]}.0{day_month[2]}"
+                    elif len(day_month) == 4:  # e.g., 1011 -> 10.11
+                        current_date_str = f"{day_month[0:2]}.{day_month[2:4]}"
+                    else:
+                        # Handle unexpected format if necessary
+                        print(
+                            f"Warning: Skipping unrecognized date format in header: {line}"
+                        )
+                        current_date_str = None
+                    if DEBUG and current_date_str:
+                        print(
+                            f"  DEBUG: Set current_date_str to: '{current_date_str}'",
                             file=sys.stderr,
                         )
 
-                    # Check for Date Header
-                    date_match = DATE_HEADER_PATTERN.search(line)
-                    if date_match:
-                        day_month = date_match.group(1).replace(
-                            ".", ""
-                        )  # Get "244" from "24.4."
+                # Check for Schedule Line if we have a current date
+                if current_date_str:
+                    schedule_match = SCHEDULE_LINE_PATTERN.match(line)
+                    if schedule_match:
                         if DEBUG:
                             print(
-                                f"  DEBUG: Date header FOUND: '{line}', extracted day_month: '{day_month}'",
+                                f"  DEBUG: Schedule line FOUND: '{line}'",
                                 file=sys.stderr,
                             )
-                        # Reformat to DD.MM
-                        if len(day_month) == 3:  # e.g., 244 -> 24.04
-                            current_date_str = f"{day_month[0:2]}.0{day_month[2]}"
-                        elif len(day_month) == 4:  # e.g., 1011 -> 10.11
-                            current_date_str = f"{day_month[0:2]}.{day_month[2:4]}"
-                        else:
-                            # Handle unexpected format if necessary
-                            print(
-                                f"Warning: Skipping unrecognized date format in header: {line}"
-                            )
-                            current_date_str = None
-                        if DEBUG and current_date_str:
+                        time = schedule_match.group(1)
+                        name = schedule_match.group(2).strip()
+                        stand = schedule_match.group(3)
+
+                        # Construct full date YYYY-MM-DD
+                        # Assuming the year is 2025 based on filename context
+                        day, month = current_date_str.split(".")
+                        full_date = f"{YEAR}-{month}-{day}"  # ISO format YYYY-MM-DD
+
+                        # Clean up potential extra spaces in name
+                        name = re.sub(r"\s+", " ", name).strip()
+                        if DEBUG:
                             print(
-                                f"  DEBUG: Set current_date_str to: '{current_date_str}'",
+                                f"  DEBUG: Extracted -> Date: {full_date}, Time: {time}, Name: '{name}', Stand: {stand}",
                                 file=sys.stderr,
                             )
 
-                    # Check for Schedule Line if we have a current date
-                    if current_date_str:
-                        schedule_match = SCHEDULE_LINE_PATTERN.match(line)
-                        if schedule_match:
-                            if DEBUG:
-                                print(
-                                    f"  DEBUG: Schedule line FOUND: '{line}'",
-                                    file=sys.stderr,
-                                )
-                            time = schedule_match.group(1)
-                            name = schedule_match.group(2).strip()
-                            stand = schedule_match.group(3)
-
-                            # Construct full date YYYY-MM-DD
-                            # Assuming the year is 2025 based on filename context
-                            day, month = current_date_str.split(".")
-                            full_date = f"{YEAR}-{month}-{day}"  # ISO format YYYY-MM-DD
-
-                            # Clean up potential extra spaces in name
-                            name = re.sub(r"\s+", " ", name).strip()
-                            if DEBUG:
-                                print(
-                                    f"  DEBUG: Extracted -> Date: {full_date}, Time: {time}, Name: '{name}', Stand: {stand}",
-                                    file=sys.stderr,
-                                )
-
-                            schedule.append(
-                                {
-                                    "date": full_date,
-                                    "time": time,
-                                    "name": name,
-                                    "stand": stand,
-                                }
-                            )
+                        schedule.append(
+                            {
+                                "date": full_date,
+                                "time": time,
+                                "name": name,
+                                "stand": stand,
+                            }
+                        )
 
     except FileNotFoundError:
         print(f"Error: PDF file not found at {pdf_path}")
         return []
     except Exception as e:
-        print(f"An error occurred during PDF parsing: {e}")
-        # Consider logging the full traceback here for debugging
-        # import traceback
-        # print(traceback.format_exc())
-        return []
+        # Raised rather than returned empty, so a broken or half-copied file is
+        # never cached or served as an empty schedule
+        raise PDFParseError(f"Could not parse rare schedule {pdf_path}: {e}") from e
 
+    if not schedule:
+        raise PDFParseError(f"No schedule entries found in {pdf_path}")
     return schedule
 
 
@@ -137,14 +348,19 @@ def parse_rare_schedule(pdf_path="Material/Rare_schedule_2025.pdf"):
 
 
 # Placeholder for wine list parsing (to be added later)
-def parse_wine_list(pdf_path="Material/Wine_list_2025.pdf"):
+def parse_wine_list(pdf_path="Material/Wine_list_2025.pdf", workers=None):
     """
     Parses the Wine List PDF to extract champagne names and prices, and identify house names.
+    Page text is extracted on `workers` processes (default PDF_WORKERS).
 
     Returns:
         tuple: A tuple containing:
             - dict: Wine details mapping full champagne names to their details.
             - list: A list of unique house names identified.
+        Both are empty if the PDF is not found.
+
+    Raises:
+        PDFParseError: If the PDF exists but could not be parsed or has no priced wines.
     """
     wine_details = {}
     house_names = set()
@@ -161,104 +377,103 @@ def parse_wine_list(pdf_path="Material/Wine_list_2025.pdf"):
     current_house_name = None
 
     try:
-        with pdfplumber.open(pdf_path) as pdf:
-            for page_num, page in enumerate(pdf.pages, 1):
-                # Use slightly wider tolerance, might help with column alignment issues
-                text = page.extract_text(x_tolerance=2, y_tolerance=3)
-                if not text:
+        # Use slightly wider tolerance, might help with column alignment issues
+        page_texts = extract_page_texts(pdf_path, workers, x_tolerance=2, y_tolerance=3)
+        # Stand and house context carries over page breaks, so pages are walked in order
+        for page_num, text in enumerate(page_texts, 1):
+            if not text:
+                continue
+
+            lines = text.split("\n")
+            for line_num, line in enumerate(lines, 1):
+                line = line.strip()
+                if not line:
                     continue
 
-                lines = text.split("\n")
-                for line_num, line in enumerate(lines, 1):
-                    line = line.strip()
-                    if not line:
-                        continue
-
-                    # 1. Check for Stand Header first
-                    stand_match = STAND_HEADER_PATTERN.match(line)
-                    if stand_match:
-                        current_stand_name = stand_match.group(1).strip()
-                        current_stand_number = stand_match.group(2).strip()
-                        current_house_name = None  # Reset house for new stand
-                        # print(f"DEBUG (Page {page_num}): Found Stand {current_stand_number}: {current_stand_name}")
-                        continue
-
-                    # Skip lines until a stand is found
-                    if not current_stand_number:
-                        continue
-
-                    # 2. Check for Pricing Line
-                    price_match = PRICE_LINE_PATTERN.match(line)
-                    if price_match:
-                        if not current_house_name:
-                            print(
-                                f"Warning: Found price line but no current house name set (Page {page_num}, Line {line_num}): {line}"
-                            )
-                            continue  # Skip this price line
-
-                        glass_price = price_match.group(1)
-                        specific_name = price_match.group(2).strip()
-                        # Group 3 is bottle price, might be None if not matched
-                        bottle_price_match = price_match.group(3)
-                        bottle_price = (
-                            bottle_price_match.replace(",", ".")
-                            if bottle_price_match
-                            else None
-                        )
+                # 1. Check for Stand Header first
+                stand_match = STAND_HEADER_PATTERN.match(line)
+                if stand_match:
+                    current_stand_name = stand_match.group(1).strip()
+                    current_stand_number = stand_match.group(2).strip()
+                    current_house_name = None  # Reset house for new stand
+                    # print(f"DEBUG (Page {page_num}): Found Stand {current_stand_number}: {current_stand_name}")
+                    continue
 
-                        # Combine House + Specific Name
-                        full_name = f"{current_house_name} {specific_name}"
-                        full_name = re.sub(r"\s+", " ", full_name).strip()
-
-                        # --- Remove Debug Print ---
-                        # if "canard" in current_house_name.lower():
-                        #      print(f"DEBUG PARSER: Storing '{full_name}' under house '{current_house_name}'", file=sys.stderr)
-                        # -------------------------
-
-                        # Store details
-                        if full_name not in wine_details:
-                            wine_details[full_name] = {
-                                "glass_price": glass_price,
-                                "bottle_price": bottle_price,  # Can be None
-                                "stand_number": current_stand_number,
-                                "stand_name": current_stand_name,
-                            }
-                        # print(f"DEBUG (Page {page_num}): Added price for '{full_name}' (Bottle: {bottle_price})")
-                        continue  # Processed price line
-
-                    # 3. If not Stand or Price, check if it's a House Name
-                    # Must NOT start with price, NOT be just grapes, NOT be an ignored header,
-                    # NOT be purely numeric, and MUST contain at least one letter.
-                    is_potential_house = (
-                        not PRICE_START_PATTERN.match(line)
-                        and not GRAPE_INFO_PATTERN.match(line)
-                        and line.upper() not in IGNORE_HEADERS
-                        and not line.isdigit()  # Added check: not just digits
-                        and any(
-                            c.isalpha() for c in line
-                        )  # Added check: contains letters
+                # Skip lines until a stand is found
+                if not current_stand_number:
+                    continue
+
+                # 2. Check for Pricing Line
+                price_match = PRICE_LINE_PATTERN.match(line)
+                if price_match:
+                    if not current_house_name:
+                        print(
+                            f"Warning: Found price line but no current house name set (Page {page_num}, Line {line_num}): {line}"
+                        )
+                        continue  # Skip this price line
+
+                    glass_price = price_match.group(1)
+                    specific_name = price_match.group(2).strip()
+                    # Group 3 is bottle price, might be None if not matched
+                    bottle_price_match = price_match.group(3)
+                    bottle_price = (
+                        bottle_price_match.replace(",", ".")
+                        if bottle_price_match
+                        else None
                     )
 
-                    if is_potential_house:
-                        # This line is identified as a house name.
-                        # It implicitly becomes the *current* house, replacing the previous one for this stand.
-                        current_house_name = line.strip()
-                        house_names.add(current_house_name)
-                        # print(f"DEBUG (Page {page_num}): Set House to '{current_house_name}'")
-                        continue  # Processed house name
+                    # Combine House + Specific Name
+                    full_name = f"{current_house_name} {specific_name}"
+                    full_name = re.sub(r"\s+", " ", full_name).strip()
+
+                    # --- Remove Debug Print ---
+                    # if "canard" in current_house_name.lower():
+                    #      print(f"DEBUG PARSER: Storing '{full_name}' under house '{current_house_name}'", file=sys.stderr)
+                    # -------------------------
+
+                    # Store details
+                    if full_name not in wine_details:
+                        wine_details[full_name] = {
+                            "glass_price": glass_price,
+                            "bottle_price": bottle_price,  # Can be None
+                            "stand_number": current_stand_number,
+                            "stand_name": current_stand_name,
+                        }
+                    # print(f"DEBUG (Page {page_num}): Added price for '{full_name}' (Bottle: {bottle_price})")
+                    continue  # Processed price line
+
+                # 3. If not Stand or Price, check if it's a House Name
+                # Must NOT start with price, NOT be just grapes, NOT be an ignored header,
+                # NOT be purely numeric, and MUST contain at least one letter.
+                is_potential_house = (
+                    not PRICE_START_PATTERN.match(line)
+                    and not GRAPE_INFO_PATTERN.match(line)
+                    and line.upper() not in IGNORE_HEADERS
+                    and not line.isdigit()  # Added check: not just digits
+                    and any(
+                        c.isalpha() for c in line
+                    )  # Added check: contains letters
+                )
+
+                if is_potential_house:
+                    # This line is identified as a house name.
+                    # It implicitly becomes the *current* house, replacing the previous one for this stand.
+                    current_house_name = line.strip()
+                    house_names.add(current_house_name)
+                    # print(f"DEBUG (Page {page_num}): Set House to '{current_house_name}'")
+                    continue  # Processed house name
 
-                    # Otherwise, the line is considered junk or unexpected format, ignore it.
-                    # print(f"DEBUG (Page {page_num}): Ignored line: '{line}'")
+                # Otherwise, the line is considered junk or unexpected format, ignore it.
+                # print(f"DEBUG (Page {page_num}): Ignored line: '{line}'")
 
     except FileNotFoundError:
         print(f"Error: Wine list PDF file not found at {pdf_path}")
         return {}, []
     except Exception as e:
-        print(f"An error occurred during wine list PDF parsing: {e}")
-        # import traceback
-        # print(traceback.format_exc())
-        return {}, []
+        raise PDFParseError(f"Could not parse wine list {pdf_path}: {e}") from e
 
+    if not wine_details:
+        raise PDFParseError(f"No priced wines found in {pdf_path}")
     return wine_details, sorted(list(house_names))
 
 
@@ -339,6 +554,33 @@ def parse_preferences(txt_path="Material/preferences.txt"):
     return preferences
 
 
+def parse_stand_map(json_path="Material/stands.json"):
+    """
+    Reads the stand coordinate table (positions on the floor plans, walkable
+    areas, stairs and walking speed) used to estimate walking times.
+
+    Returns:
+        dict: The parsed table, or None if the file is missing or invalid.
+    """
+    try:
+        with open(json_path, "r", encoding="utf-8") as f:
+            stand_map = json.load(f)
+    except FileNotFoundError:
+        print(f"Warning: Stand map not found at {json_path}. Walking times disabled.")
+        return None
+    except (OSError, ValueError) as e:
+        print(f"Error reading stand map {json_path}: {e}", file=sys.stderr)
+        return None
+
+    # Stand numbers are strings in the schedule, positions are [floor, x, y]
+    for section in ("stands", "waypoints"):
+        stand_map[section] = {
+            str(name): tuple(position)
+            for name, position in stand_map.get(section, {}).items()
+        }
+    return stand_map
+
+
 # --- Main execution block ---
 if __name__ == "__main__":
     # Example usage when running this script directly
@@ -0,0 +1,26 @@
+from collections import namedtuple
+
+# Busy time as sorted, non-overlapping half-open [start, end) intervals, with
+# starts and ends in parallel tuples for binary search.
+BusyIntervals = namedtuple("BusyIntervals", ["starts", "ends"])
+
+
+def merge_intervals(slots):
+    """
+    Merges (start, end) slots into sorted, non-overlapping intervals.
+    Overlapping and touching slots (one ends when the next starts) are joined.
+
+    Returns:
+        BusyIntervals: The merged intervals.
+    """
+    merged = []
+    for start, end in sorted(slot for slot in slots if slot[0] < slot[1]):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return BusyIntervals(
+        starts=tuple(start for start, _ in merged),
+        ends=tuple(end for _, end in merged),
+    )
@@ -1,11 +1,25 @@
+import hashlib
 import requests
 import re
 import json
 import sys
+import tempfile
+import threading
 from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from requests.adapters import HTTPAdapter
+from urllib.parse import urljoin, urlsplit
+from urllib3.util.retry import Retry
 import os
 
+# Ensure the project root is in the Python path when run as a script
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from src import class_page
+from src.class_page import extract_class_page
+
 # --- Configuration ---
 MAIN_LIST_URL = "https://grandchampagnehelsinki.fi/master-class-luennot-lista/"
 OUTPUT_DIR = "Material"
@@ -13,6 +27,15 @@ OUTPUT_FILENAME = "master_classes.json"
 # Ensure the Material directory exists
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 OUTPUT_PATH = os.path.join(OUTPUT_DIR, OUTPUT_FILENAME)
+HTTP_CACHE_DIR = os.path.join(OUTPUT_DIR, "http_cache")  # Conditional-request cache
+
+# --- HTTP Settings ---
+REQUEST_TIMEOUT = 15  # Seconds per request (connect and read)
+MAX_WORKERS = 8  # Detail pages fetched in parallel
+MAX_REQUESTS_PER_HOST = 4  # Be polite to the organiser's server
+RETRY_TOTAL = 3  # Retries per request on connection errors and 429/5xx
+RETRY_BACKOFF_FACTOR = 0.5  # Sleeps 0.5 s, 1 s, 2 s ... between retries
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
 
 # Mapping Finnish month abbreviations to numbers (adjust if needed)
 MONTH_MAP_FI = {
@@ -53,86 +76,160 @@ def parse_session_datetime(day_str, time_str):
     return date_str, time_str_clean
 
 
-# Define a function to scrape a single detail page
-def scrape_detail_page(url):
-    print(f"  Scraping detail page: {url}")
-    try:
-        response = requests.get(url, timeout=15)  # Increased timeout slightly
+# --- HTTP Session ---
+_host_semaphores = {}
+_host_semaphores_lock = threading.Lock()
+
+
+def create_session(max_workers=MAX_WORKERS):
+    """
+    Creates the keep-alive session shared by all fetches of one scrape.
+    Failed connections and 429/5xx responses are retried with exponential
+    backoff (honouring Retry-After), and the connection pool is sized so
+    every worker can hold a connection.
+    """
+    retry = Retry(
+        total=RETRY_TOTAL,
+        backoff_factor=RETRY_BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUS_CODES,
+        allowed_methods=frozenset(["GET", "HEAD"]),
+        raise_on_status=False,  # Hand the last response to raise_for_status()
+    )
+    adapter = HTTPAdapter(
+        max_retries=retry, pool_connections=max_workers, pool_maxsize=max_workers
+    )
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def _host_semaphore(url):
+    """Returns the semaphore limiting concurrent requests to url's host."""
+    host = urlsplit(url).netloc
+    with _host_semaphores_lock:
+        if host not in _host_semaphores:
+            _host_semaphores[host] = threading.BoundedSemaphore(MAX_REQUESTS_PER_HOST)
+        return _host_semaphores[host]
+
+
+def fetch_page(session, url, headers=None):
+    """GETs url through the shared session, at most MAX_REQUESTS_PER_HOST at a time per host."""
+    with _host_semaphore(url):
+        response = session.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+    if response.status_code != 304:
         response.raise_for_status()
-        # Explicitly decode as UTF-8, sometimes requests guesses wrong
-        response.encoding = "utf-8"
-        soup = BeautifulSoup(response.text, "html.parser")
-
-        # Find the main content area more reliably
-        content_area = soup.find("div", class_="post-content")
-        if not content_area:
-            print(f"  Warning: Could not find 'post-content' div on {url}")
-            return [], None  # Return empty wines, None title
-
-        # --- Extract Title --- #
-        # Often the title is in an <h2> within the content or a main <h1>
-        title_tag = content_area.find("h2")
-        if not title_tag:
-            title_tag = soup.find("h1", class_="entry-title")  # Check page title
-        title = title_tag.get_text(strip=True) if title_tag else "Unknown Class Title"
-        # Simplify title if needed (e.g., remove "Champagne X – " prefix)
-        title = re.sub(r"^Champagne [^-]+ –\s*", "", title).strip()
-
-        # --- Extract Wines --- #
-        wine_list_header = content_area.find(
-            lambda tag: tag.name in ["h2", "h3", "strong", "p"]
-            and (
-                "Maisteltavat samppanjat:" in tag.get_text()
-                or "Champagnes:" in tag.get_text()
-            )
+    # Explicitly decode as UTF-8, sometimes requests guesses wrong
+    response.encoding = "utf-8"
+    return response
+
+
+# --- On-disk HTTP Cache ---
+# Hash of this file and the class page extractor: cached parse results are
+# reused only while the parsing code is unchanged
+_fingerprint = hashlib.sha256()
+for _path in (__file__, class_page.__file__):
+    with open(os.path.abspath(_path), "rb") as _source:
+        _fingerprint.update(_source.read())
+PARSER_FINGERPRINT = _fingerprint.hexdigest()
+
+
+class HttpCache:
+    """
+    On-disk cache of fetched pages, one JSON file per URL holding the
+    response validators (ETag, Last-Modified), the body and the parse result.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, url):
+        return os.path.join(
+            self.directory, hashlib.sha256(url.encode("utf-8")).hexdigest() + ".json"
         )
 
-        wines = []
-        if wine_list_header:
-            element = wine_list_header.find_next_sibling()
-            processed_text = set()  # Avoid adding duplicates from nested tags
-
-            while element:
-                # Stop if we hit another header or known unrelated section
-                if element.name in ["h2", "h3"] or (
-                    element.name == "p"
-                    and element.find("a", href=lambda href: href and "mailto:" in href)
-                ):
-                    break
-
-                if element.name == "ul":
-                    for li in element.find_all("li"):
-                        wine_name = li.get_text(strip=True)
-                        if wine_name and wine_name not in processed_text:
-                            wines.append(wine_name)
-                            processed_text.add(wine_name)
-                elif element.name == "p":
-                    # Handle text possibly split by <br>
-                    raw_html = element.decode_contents()
-                    potential_wines = [
-                        BeautifulSoup(part, "html.parser").get_text(strip=True)
-                        for part in raw_html.split("<br/>")
-                    ]
-                    for wine_name in potential_wines:
-                        # Heuristics: not too short, not just uppercase (like headers), not irrelevant phrases
-                        if (
-                            wine_name
-                            and len(wine_name) > 5
-                            and not wine_name.isupper()
-                            and "Please note" not in wine_name
-                            and "Buy a ticket" not in wine_name
-                            and wine_name not in processed_text
-                        ):
-                            wines.append(wine_name)
-                            processed_text.add(wine_name)
-
-                element = element.find_next_sibling()
-        else:
-            print(f"  Warning: Could not find wine list header for '{title}' on {url}")
-
-        if not wines:
-            print(f"  Warning: Could not extract wine list for '{title}' from {url}")
+    def get(self, url):
+        """Returns the cached entry for url, or None if missing or unreadable."""
+        try:
+            with open(self._path(url), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"  Warning: Ignoring unreadable cache entry for {url}: {e}")
+            return None
+        return entry if entry.get("url") == url else None
+
+    def put(self, url, entry):
+        """Atomically writes the entry for url."""
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(dict(entry, url=url), f, ensure_ascii=False)
+            os.replace(tmp_path, self._path(url))
+        except Exception:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+
+def fetch_parsed(session, url, parse, cache=None):
+    """
+    Fetches url and returns parse(html, url). With a cache, the request is
+    conditional on the stored ETag/Last-Modified; a 304 answer reuses the
+    stored parse result (or re-parses the stored body if the parsing code
+    changed), so unchanged pages cost neither the download nor the parsing.
+    """
+    entry = cache.get(url) if cache else None
+    headers = {}
+    if entry:
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+    response = fetch_page(session, url, headers)
+    if response.status_code == 304:
+        if not entry:  # Only possible if the server ignores our (absent) validators
+            raise requests.exceptions.HTTPError(f"Unexpected 304 for {url}", response=response)
+        if entry.get("parser") == PARSER_FINGERPRINT:
+            print(f"  Not modified: {url}")
+            return entry["parsed"]
+        body = entry["body"]
+    else:
+        body = response.text
+        entry = {
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+        }
+
+    parsed = parse(body, url)
+    if cache and (entry.get("etag") or entry.get("last_modified")):
+        # JSON round trip, so fresh and cached results have the same shape
+        parsed = json.loads(json.dumps(parsed, ensure_ascii=False))
+        cache.put(
+            url,
+            {
+                "etag": entry.get("etag"),
+                "last_modified": entry.get("last_modified"),
+                "body": body,
+                "parser": PARSER_FINGERPRINT,
+                "parsed": parsed,
+            },
+        )
+    return parsed
+
 
+# Define a function to scrape a single detail page
+def scrape_detail_page(url, session=None, cache=None):
+    print(f"  Scraping detail page: {url}")
+    try:
+        if session is None:
+            session = create_session(max_workers=1)
+        wines, title = fetch_parsed(session, url, parse_detail_page, cache)
         return wines, title
 
     except requests.exceptions.RequestException as e:
@@ -143,125 +240,204 @@ def scrape_detail_page(url):
         return [], "Error Parsing Title"
 
 
-# Main scraping function
-def scrape_and_save_master_classes(output_path):
-    print(f"Starting scrape of {MAIN_LIST_URL}...")
-    master_classes_dict = {}  # Use dict to handle duplicates by URL/Title
+def parse_detail_page(html, url):
+    """
+    Extracts the class title and wine list from a detail page.
 
-    try:
-        response = requests.get(MAIN_LIST_URL, timeout=15)
-        response.raise_for_status()
-        response.encoding = "utf-8"
-        soup = BeautifulSoup(response.text, "html.parser")
-
-        # Find the main content area where the list is
-        list_content = soup.find("div", class_="post-content")
-        if not list_content:
-            print(
-                "Error: Could not find main content area ('post-content') on list page."
-            )
-            return
+    Returns:
+        tuple: (wines, title); title is None if the page has no content area.
+    """
+    page = extract_class_page(html)
+    if not page.has_content:
+        print(f"  Warning: Could not find 'post-content' div on {url}")
+        return [], None  # Return empty wines, None title
+
+    # --- Extract Title --- #
+    title = page.title or "Unknown Class Title"
+    # Simplify title if needed (e.g., remove "Champagne X – " prefix)
+    title = re.sub(r"^Champagne [^-]+ –\s*", "", title).strip()
+
+    # --- Extract Wines --- #
+    if not page.wines:
+        print(f"  Warning: Could not extract wine list for '{title}' from {url}")
+
+    return page.wines, title
+
+
+def scrape_detail_pages(urls, session, max_workers=MAX_WORKERS, cache=None):
+    """
+    Scrapes detail pages concurrently on a bounded thread pool sharing one session.
+
+    Returns:
+        dict: url -> (wines, title), as returned by scrape_detail_page.
+    """
+    unique_urls = list(dict.fromkeys(urls))
+    if not unique_urls:
+        return {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        results = pool.map(
+            lambda url: scrape_detail_page(url, session, cache), unique_urls
+        )
+        return dict(zip(unique_urls, results))
+
+
+def parse_list_page(html, list_url):
+    """
+    Parses the master class list page.
 
-        day_headers = list_content.find_all("h3")
-        current_day_str = None
-
-        for header in day_headers:
-            day_text = header.get_text(strip=True)
-            if (
-                "Torstai" in day_text
-                or "Perjantai" in day_text
-                or "Lauantai" in day_text
-            ):
-                current_day_str = day_text.replace("**", "").replace("\\.", ".").strip()
-                print(f"\nProcessing Day: {current_day_str}")
-
-            element = header.find_next_sibling()
-            while element and element.name != "h3":
+    Returns:
+        tuple: (master_classes_dict keyed by detail URL or class text, with
+               empty wine lists; {key: detail page URL}), or None if the page
+               has no content area.
+    """
+    master_classes_dict = {}  # Use dict to handle duplicates by URL/Title
+    detail_urls = {}  # Class key -> detail page URL, fetched after the list is parsed
+    soup = BeautifulSoup(html, "html.parser")
+
+    # Find the main content area where the list is
+    list_content = soup.find("div", class_="post-content")
+    if not list_content:
+        print(
+            "Error: Could not find main content area ('post-content') on list page."
+        )
+        return None
+
+    day_headers = list_content.find_all("h3")
+    current_day_str = None
+
+    for header in day_headers:
+        day_text = header.get_text(strip=True)
+        if (
+            "Torstai" in day_text
+            or "Perjantai" in day_text
+            or "Lauantai" in day_text
+        ):
+            current_day_str = day_text.replace("**", "").replace("\\.", ".").strip()
+            print(f"\nProcessing Day: {current_day_str}")
+
+        element = header.find_next_sibling()
+        while element and element.name != "h3":
+            # --- DEBUG --- #
+            print(f"DEBUG Loop: Processing element: <{element.name}>")
+            try:
+                # Print limited text content to avoid flooding logs
+                el_text = element.get_text(strip=True)[:100]
+                print(f"DEBUG Loop: Element text (start): '{el_text}'...")
+            except:
+                print("DEBUG Loop: Could not get text for element")
+            # ------------- #
+
+            if element.name == "p":
+                class_text_raw = element.get_text()  # Get text for regex matching
                 # --- DEBUG --- #
-                print(f"DEBUG Loop: Processing element: <{element.name}>")
-                try:
-                    # Print limited text content to avoid flooding logs
-                    el_text = element.get_text(strip=True)[:100]
-                    print(f"DEBUG Loop: Element text (start): '{el_text}'...")
-                except:
-                    print("DEBUG Loop: Could not get text for element")
+                print(f"DEBUG P-Tag: Raw text for regex: '{class_text_raw}'")
+                # ------------- #
+                time_match = re.match(
+                    r"\s*(\d{1,2}:\d{2})\s*–\s*(.*)", class_text_raw
+                )
+                # --- DEBUG --- #
+                if time_match:
+                    print(
+                        f"DEBUG P-Tag: Regex matched! Time='{time_match.group(1)}', Info='{time_match.group(2)[:50]}...'"
+                    )
+                else:
+                    print("DEBUG P-Tag: Regex did NOT match.")
                 # ------------- #
 
-                if element.name == "p":
-                    class_text_raw = element.get_text()  # Get text for regex matching
-                    # --- DEBUG --- #
-                    print(f"DEBUG P-Tag: Raw text for regex: '{class_text_raw}'")
-                    # ------------- #
-                    time_match = re.match(
-                        r"\s*(\d{1,2}:\d{2})\s*–\s*(.*)", class_text_raw
+                if time_match and current_day_str:
+                    time_str = time_match.group(1)
+                    class_info_part = time_match.group(2).strip()
+                    detail_link_tag = element.find("a", href=True)
+                    detail_url = (
+                        urljoin(list_url, detail_link_tag["href"])
+                        if detail_link_tag
+                        else None
                     )
-                    # --- DEBUG --- #
-                    if time_match:
-                        print(
-                            f"DEBUG P-Tag: Regex matched! Time='{time_match.group(1)}', Info='{time_match.group(2)[:50]}...'"
-                        )
-                    else:
-                        print("DEBUG P-Tag: Regex did NOT match.")
-                    # ------------- #
-
-                    if time_match and current_day_str:
-                        time_str = time_match.group(1)
-                        class_info_part = time_match.group(2).strip()
-                        detail_link_tag = element.find("a", href=True)
-                        detail_url = (
-                            detail_link_tag["href"] if detail_link_tag else None
-                        )
-
-                        # Use URL as the primary key if possible, otherwise use the text as fallback key
-                        key = detail_url if detail_url else class_info_part
-                        if not key:  # Skip if no key can be determined
-                            element = element.find_next_sibling()
-                            continue
-
-                        date_str, clean_time_str = parse_session_datetime(
-                            current_day_str, time_str
-                        )
-                        if not date_str or not clean_time_str:
-                            element = element.find_next_sibling()
-                            continue
-
-                        session_info = {"date": date_str, "time": clean_time_str}
-
-                        if key not in master_classes_dict:
-                            print(f"  Found new class entry: {class_info_part[:60]}...")
-                            wines = []
-                            title = (
-                                class_info_part.split(":")[1].split("–")[0].strip()
-                                if ":" in class_info_part
-                                else class_info_part
-                            )  # Default title
-                            if detail_url:
-                                wines, fetched_title = scrape_detail_page(detail_url)
-                                if fetched_title:
-                                    title = fetched_title  # Use title from detail page if found
-                            else:
-                                print(f"  Warning: No detail URL found for {title}")
-
-                            master_classes_dict[key] = {
-                                "name": title,
-                                "sessions": [session_info],
-                                "duration_minutes": 50,
-                                "wines": wines,
-                            }
+
+                    # Use URL as the primary key if possible, otherwise use the text as fallback key
+                    key = detail_url if detail_url else class_info_part
+                    if not key:  # Skip if no key can be determined
+                        element = element.find_next_sibling()
+                        continue
+
+                    date_str, clean_time_str = parse_session_datetime(
+                        current_day_str, time_str
+                    )
+                    if not date_str or not clean_time_str:
+                        element = element.find_next_sibling()
+                        continue
+
+                    session_info = {"date": date_str, "time": clean_time_str}
+
+                    if key not in master_classes_dict:
+                        print(f"  Found new class entry: {class_info_part[:60]}...")
+                        title = (
+                            class_info_part.split(":")[1].split("–")[0].strip()
+                            if ":" in class_info_part
+                            else class_info_part
+                        )  # Default title
+                        if detail_url:
+                            detail_urls[key] = detail_url
                         else:
-                            # Existing entry, just add the session if it's not already there
-                            if session_info not in master_classes_dict[key]["sessions"]:
-                                master_classes_dict[key]["sessions"].append(
-                                    session_info
-                                )
-                                print(
-                                    f"    Added session {date_str} {clean_time_str} to existing: {master_classes_dict[key]['name']}"
-                                )
+                            print(f"  Warning: No detail URL found for {title}")
+
+                        master_classes_dict[key] = {
+                            "name": title,
+                            "sessions": [session_info],
+                            "duration_minutes": 50,
+                            "wines": [],
+                        }
+                    else:
+                        # Existing entry, just add the session if it's not already there
+                        if session_info not in master_classes_dict[key]["sessions"]:
+                            master_classes_dict[key]["sessions"].append(
+                                session_info
+                            )
+                            print(
+                                f"    Added session {date_str} {clean_time_str} to existing: {master_classes_dict[key]['name']}"
+                            )
+
+            element = element.find_next_sibling()
+
+    return master_classes_dict, detail_urls
 
-                element = element.find_next_sibling()
+
+# Main scraping function
+def scrape_and_save_master_classes(
+    output_path,
+    list_url=MAIN_LIST_URL,
+    session=None,
+    max_workers=MAX_WORKERS,
+    cache_dir=HTTP_CACHE_DIR,
+):
+    """
+    Scrapes the master class list page at list_url and all linked detail pages,
+    and saves the result as JSON. list_url and session can point the scraper at
+    a local stub server; cache_dir=None disables the on-disk HTTP cache.
+    """
+    print(f"Starting scrape of {list_url}...")
+    if session is None:
+        session = create_session(max_workers)
+    cache = HttpCache(cache_dir) if cache_dir else None
+
+    try:
+        parsed_list = fetch_parsed(session, list_url, parse_list_page, cache)
+        if parsed_list is None:
+            return
+        master_classes_dict, detail_urls = parsed_list
+
+        # --- Fetch all detail pages concurrently --- #
+        print(f"\nFetching {len(set(detail_urls.values()))} detail pages...")
+        details = scrape_detail_pages(detail_urls.values(), session, max_workers, cache)
+        for key, detail_url in detail_urls.items():
+            wines, fetched_title = details[detail_url]
+            master_classes_dict[key]["wines"] = wines
+            if fetched_title:
+                # Use title from detail page if found
+                master_classes_dict[key]["name"] = fetched_title
 
     except requests.exceptions.RequestException as e:
-        print(f"Error fetching main list page {MAIN_LIST_URL}: {e}")
+        print(f"Error fetching main list page {list_url}: {e}")
         return
     except Exception as e:
         import traceback
@@ -289,4 +465,7 @@ def scrape_and_save_master_classes(output_path):
 
 # --- Main Execution Guard ---
 if __name__ == "__main__":
-    scrape_and_save_master_classes(OUTPUT_PATH)
+    # Optional argument: list page URL (e.g. a local stub server for testing)
+    scrape_and_save_master_classes(
+        OUTPUT_PATH, list_url=sys.argv[1] if len(sys.argv) > 1 else MAIN_LIST_URL
+    )
@@ -0,0 +1,237 @@
+"""
+Checks the scraper's HTTP behaviour against a local stub of the festival site:
+
+    python -m src.scraper_check
+
+The stub serves a master class list page and DETAIL_PAGES detail pages, each
+answered after DETAIL_DELAY_SECONDS, and one detail page fails with a 503
+the first time it is requested. Every page has an ETag and is answered with
+304 Not Modified when the request's If-None-Match matches it. The checks
+scrape it and verify that:
+- the detail pages are fetched concurrently but never more than
+  MAX_REQUESTS_PER_HOST at a time, and the failed page is retried and parsed;
+- with the on-disk HTTP cache, repeated scrapes get 304 for every page, parse
+  no HTML and save the same classes as the first scrape.
+Exits with status 1 if any check fails.
+"""
+import contextlib
+import hashlib
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from . import scraper
+
+DETAIL_PAGES = 12
+DETAIL_DELAY_SECONDS = 0.3
+FLAKY_PAGE = 5  # Answers 503 on its first request
+
+# --- Stub Site --- #
+_LIST_PAGE = """<html><body><div class="post-content">
+<h3>Torstai 24. huhtikuuta</h3>
+{classes}
+</div></body></html>"""
+_LIST_ENTRY = (
+    '<p>{hour}:00 – <a href="/detail/{n}/">Champagne House {n}: Class {n} – Presenter</a></p>'
+)
+_DETAIL_PAGE = """<html><body><div class="post-content">
+<h2>Champagne House {n} – Class {n}</h2>
+<p><strong>Champagnes:</strong></p>
+<ul><li>House {n} Brut NV</li><li>House {n} Vintage 2012</li></ul>
+</div></body></html>"""
+
+
+class StubSite:
+    """The stub server, with counters of what it was asked for."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.active = 0
+        self.peak_active = 0
+        self.requests = {}  # Path -> number of requests
+        self.not_modified = 0  # Requests answered with 304
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                site.handle(self)
+
+            def log_message(self, format, *args):
+                pass  # Keep the report readable
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def handle(self, request):
+        with self.lock:
+            self.requests[request.path] = self.requests.get(request.path, 0) + 1
+            attempt = self.requests[request.path]
+            self.active += 1
+            self.peak_active = max(self.peak_active, self.active)
+        try:
+            if request.path == "/list/":
+                classes = "\n".join(
+                    _LIST_ENTRY.format(n=n, hour=10 + n) for n in range(1, DETAIL_PAGES + 1)
+                )
+                self.send(request, 200, _LIST_PAGE.format(classes=classes))
+                return
+            n = int(request.path.strip("/").split("/")[-1])
+            time.sleep(DETAIL_DELAY_SECONDS)
+            if n == FLAKY_PAGE and attempt == 1:
+                self.send(request, 503, "Busy, try again")
+            else:
+                self.send(request, 200, _DETAIL_PAGE.format(n=n))
+        finally:
+            with self.lock:
+                self.active -= 1
+
+    def send(self, request, status, body):
+        data = body.encode("utf-8")
+        if status == 200:
+            etag = f'"{hashlib.sha256(data).hexdigest()[:16]}"'
+            if request.headers.get("If-None-Match") == etag:
+                with self.lock:
+                    self.not_modified += 1
+                request.send_response(304)
+                request.send_header("ETag", etag)
+                request.end_headers()
+                return
+        request.send_response(status)
+        request.send_header("Content-Type", "text/html; charset=utf-8")
+        request.send_header("Content-Length", str(len(data)))
+        if status == 200:
+            request.send_header("ETag", etag)
+        request.end_headers()
+        request.wfile.write(data)
+
+
+# --- Checks --- #
+def _scrape(site, output_path, cache_dir=None):
+    """
+    Runs one scrape against the stub, with the scraper's own log captured.
+
+    Returns:
+        tuple: (seconds taken, scraped classes).
+    """
+    log = io.StringIO()
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(log):
+        scraper.scrape_and_save_master_classes(
+            output_path, list_url=f"{site.url}/list/", cache_dir=cache_dir
+        )
+    elapsed = time.perf_counter() - started
+    try:
+        with open(output_path, "r", encoding="utf-8") as f:
+            return elapsed, json.load(f)
+    except FileNotFoundError:
+        print(log.getvalue()[-2000:])  # The scraper reports why it saved nothing
+        raise
+
+
+def check_concurrent_fetch(work_dir):
+    """
+    Detail pages are fetched in parallel, at most MAX_REQUESTS_PER_HOST at a
+    time, and a 503 is retried.
+
+    Returns:
+        list: Failure messages (empty if all checks passed).
+    """
+    failures = []
+    with StubSite() as site:
+        elapsed, classes = _scrape(site, os.path.join(work_dir, "concurrent.json"))
+        sequential = DETAIL_PAGES * DETAIL_DELAY_SECONDS
+        print(f"  Scraped {len(classes)} classes in {elapsed:.2f} s (sequential: ~{sequential:.1f} s)")
+        print(f"  Peak concurrent requests: {site.peak_active}")
+        if elapsed >= sequential / 2:
+            failures.append(f"detail pages were not fetched concurrently ({elapsed:.2f} s)")
+        if site.peak_active > scraper.MAX_REQUESTS_PER_HOST:
+            failures.append(
+                f"{site.peak_active} concurrent requests to one host "
+                f"(limit {scraper.MAX_REQUESTS_PER_HOST})"
+            )
+        if site.requests.get(f"/detail/{FLAKY_PAGE}/", 0) < 2:
+            failures.append("the 503 page was not retried")
+        if len(classes) != DETAIL_PAGES or not all(c["wines"] for c in classes):
+            failures.append("not every detail page was scraped and parsed")
+    return failures
+
+
+def check_conditional_requests(work_dir):
+    """
+    With the HTTP cache, the second and third scrapes are answered with 304
+    for every page, run no HTML parsing and produce the same classes.
+
+    Returns:
+        list: Failure messages (empty if all checks passed).
+    """
+    failures = []
+    cache_dir = os.path.join(work_dir, "http_cache")
+    parse_calls = []
+    original_parsers = scraper.parse_list_page, scraper.parse_detail_page
+
+    def counted(parse):
+        def wrapper(html, url):
+            parse_calls.append(url)
+            return parse(html, url)
+
+        return wrapper
+
+    # scrape_and_save_master_classes looks the parsers up at call time
+    scraper.parse_list_page, scraper.parse_detail_page = map(counted, original_parsers)
+    try:
+        with StubSite() as site:
+            output_path = os.path.join(work_dir, "conditional.json")
+            _, first = _scrape(site, output_path, cache_dir)
+            print(f"  Run 1: {len(parse_calls)} pages parsed")
+            for run in (2, 3):
+                parse_calls.clear()
+                not_modified_before = site.not_modified
+                _, classes = _scrape(site, output_path, cache_dir)
+                not_modified = site.not_modified - not_modified_before
+                print(f"  Run {run}: {not_modified} of {DETAIL_PAGES + 1} pages not modified, {len(parse_calls)} parsed")
+                if not_modified != DETAIL_PAGES + 1:
+                    failures.append(f"run {run}: only {not_modified} pages answered with 304")
+                if parse_calls:
+                    failures.append(f"run {run}: {len(parse_calls)} pages were parsed again")
+                if classes != first:
+                    failures.append(f"run {run}: the saved classes differ from run 1")
+    finally:
+        scraper.parse_list_page, scraper.parse_detail_page = original_parsers
+    return failures
+
+
+def run_checks():
+    """
+    Runs every check and prints the results.
+
+    Returns:
+        bool: True if all checks passed.
+    """
+    failures = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for check in (check_concurrent_fetch, check_conditional_requests):
+            print(f"{check.__name__}:")
+            check_failures = check(work_dir)
+            for failure in check_failures:
+                print(f"  FAILED: {failure}")
+            failures.extend(check_failures)
+    print("\nAll checks passed." if not failures else f"\n{len(failures)} check(s) failed.")
+    return not failures
+
+
+if __name__ == "__main__":
+    sys.exit(0 if run_checks() else 1)
@@ -0,0 +1,116 @@
+import hashlib
+import os
+import pickle
+import struct
+import sys
+import tempfile
+
+# --- Snapshot File Format ---
+# MAGIC (7 bytes) + format version (unsigned short, big endian) + pickled payload.
+# The payload maps each data source key to the content hash of its input file
+# and the parser output for that file, so a changed PDF only invalidates itself.
+# It also holds the rare wine price table with the hashes it was matched from.
+SNAPSHOT_FILENAME = "parsed_data.snapshot"
+SNAPSHOT_MAGIC = b"GCHSNAP"
+SNAPSHOT_FORMAT_VERSION = 1
+_HEADER = struct.Struct(">H")
+# ----------------------------
+
+
+def file_sha256(path):
+    """Returns the hex SHA-256 of a file's contents, or None if it does not exist."""
+    digest = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+    except FileNotFoundError:
+        return None
+    return digest.hexdigest()
+
+
+def file_signature(path):
+    """Cheap change-detection key for a file: (mtime_ns, size), or None if missing."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def parser_fingerprint():
+    """Hash of the parser source, so snapshots are rebuilt when parsing rules change."""
+    from . import data_parser
+
+    return file_sha256(data_parser.__file__)
+
+
+def load_snapshot(snapshot_path):
+    """
+    Reads a snapshot file.
+
+    Returns:
+        dict: The payload ({'parser': str, 'sources': {key: {'sha256', 'data'}},
+              'price_table': {'inputs', 'data'}}), or None if the file is missing, from another format version, or corrupt.
+    """
+    try:
+        with open(snapshot_path, "rb") as f:
+            raw = f.read()
+    except FileNotFoundError:
+        return None
+    except OSError as e:
+        print(f"Warning: Could not read snapshot {snapshot_path}: {e}", file=sys.stderr)
+        return None
+
+    header_len = len(SNAPSHOT_MAGIC) + _HEADER.size
+    if len(raw) < header_len or not raw.startswith(SNAPSHOT_MAGIC):
+        print(f"Warning: Ignoring invalid snapshot file {snapshot_path}", file=sys.stderr)
+        return None
+    (version,) = _HEADER.unpack_from(raw, len(SNAPSHOT_MAGIC))
+    if version != SNAPSHOT_FORMAT_VERSION:
+        print(
+            f"Snapshot {snapshot_path} has format version {version}, expected {SNAPSHOT_FORMAT_VERSION}; ignoring it."
+        )
+        return None
+
+    try:
+        payload = pickle.loads(raw[header_len:])
+    except Exception as e:
+        print(f"Warning: Could not decode snapshot {snapshot_path}: {e}", file=sys.stderr)
+        return None
+    if not isinstance(payload, dict) or "sources" not in payload:
+        return None
+    return payload
+
+
+def save_snapshot(snapshot_path, payload):
+    """Atomically writes a snapshot, so concurrent workers never read a partial file."""
+    directory = os.path.dirname(os.path.abspath(snapshot_path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".snapshot-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(SNAPSHOT_MAGIC)
+            f.write(_HEADER.pack(SNAPSHOT_FORMAT_VERSION))
+            pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.chmod(tmp_path, 0o644)  # mkstemp creates owner-only files
+        os.replace(tmp_path, snapshot_path)
+    except Exception:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+# --- Build Step ---
+# Run before starting the server (e.g. in the deploy script):
+#     python -m src.snapshot [Material]
+if __name__ == "__main__":
+    from .core_logic import load_all_data
+
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    material_path = (
+        sys.argv[1] if len(sys.argv) > 1 else os.path.join(project_root, "Material")
+    )
+    load_all_data(material_path)
+    print(f"Snapshot ready: {os.path.join(material_path, SNAPSHOT_FILENAME)}")
@@ -0,0 +1,126 @@
+"""
+Startup-time report for a worker booting the app:
+
+    python -m src.startup_report [--budget SECONDS] [--top N]
+
+Boots the app in a fresh interpreter (as a gunicorn worker does: import
+src.app, which loads the data, then serve a request), and reports the
+slowest imports (python -X importtime), the time to import the app and to
+serve the first request, and which of the optional heavy dependencies were
+imported. Exits with status 1 when the time to the first served request
+exceeds the budget, so a deploy script can hold boot time under it.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+BOOT_BUDGET_SECONDS = 2.0  # Interpreter start to first served request
+DEFAULT_TOP_IMPORTS = 15
+# Only needed when parsing PDFs or fuzzy matching names, i.e. without an up-to-date snapshot
+DEFERRED_MODULES = ("pdfplumber", "pdfminer", "thefuzz", "Levenshtein")
+FIRST_REQUEST_PATH = "/api/status"
+
+# Runs in the child interpreter; prints one JSON line with its own timings
+_CHILD_SCRIPT = f"""
+import json, sys, time
+started = time.perf_counter()
+import src.app
+imported = time.perf_counter()
+response = src.app.app.test_client().get({FIRST_REQUEST_PATH!r})
+served = time.perf_counter()
+print(json.dumps({{
+    "served_at": time.time(),
+    "import_seconds": imported - started,
+    "first_request_seconds": served - imported,
+    "status_code": response.status_code,
+    "deferred_loaded": [m for m in {DEFERRED_MODULES!r} if m in sys.modules],
+}}))
+"""
+
+
+def parse_importtime(stderr_text):
+    """
+    Parses `python -X importtime` output.
+
+    Returns:
+        list: (module, cumulative seconds, nesting depth) in import order.
+    """
+    imports = []
+    for line in stderr_text.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        try:
+            _, cumulative, name = line[len("import time:") :].split("|", 2)
+            cumulative_us = int(cumulative)
+        except ValueError:
+            continue  # The header line
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        imports.append((name.strip(), cumulative_us / 1e6, depth))
+    return imports
+
+
+def top_level_imports(imports, top):
+    """The slowest packages (and src modules), by cumulative import time."""
+    packages = {}
+    for name, seconds, _ in imports:
+        key = name if name.startswith("src.") else name.split(".")[0]
+        if key == name:  # The package itself, which includes its submodules
+            packages[key] = max(packages.get(key, 0.0), seconds)
+    return sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+
+
+def run_startup_report(budget=BOOT_BUDGET_SECONDS, top=DEFAULT_TOP_IMPORTS):
+    """
+    Boots the app in a child interpreter and prints the report.
+
+    Returns:
+        bool: True if the first request was served within the budget.
+    """
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    spawned_at = time.time()
+    child = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _CHILD_SCRIPT],
+        cwd=project_root,
+        capture_output=True,
+        text=True,
+    )
+    try:
+        timings = json.loads(child.stdout.strip().splitlines()[-1])
+    except (IndexError, ValueError):
+        print("Boot failed:", file=sys.stderr)
+        print(child.stdout[-2000:], child.stderr[-2000:], file=sys.stderr)
+        return False
+    # Wall clock, as the child's perf_counter does not share our origin
+    to_first_request = timings["served_at"] - spawned_at
+    interpreter_seconds = (
+        to_first_request - timings["import_seconds"] - timings["first_request_seconds"]
+    )
+
+    print("Slowest imports (cumulative, nested imports count toward their parents):")
+    for name, seconds in top_level_imports(parse_importtime(child.stderr), top):
+        print(f"  {seconds * 1000:8.1f} ms  {name}")
+    print()
+    print(f"  Interpreter start         {interpreter_seconds:7.3f} s")
+    print(f"  Import src.app (+ data)   {timings['import_seconds']:7.3f} s")
+    print(
+        f"  First request             {timings['first_request_seconds']:7.3f} s"
+        f"  (GET {FIRST_REQUEST_PATH} -> {timings['status_code']})"
+    )
+    print(f"  To first served request   {to_first_request:7.3f} s  (budget {budget:.3f} s)")
+    deferred = timings["deferred_loaded"]
+    print(f"  Deferred modules loaded:  {', '.join(deferred) if deferred else 'none'}")
+
+    within_budget = to_first_request <= budget
+    print("\nWithin budget." if within_budget else "\nOVER BUDGET.")
+    return within_budget
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report worker startup time.")
+    parser.add_argument("--budget", type=float, default=BOOT_BUDGET_SECONDS)
+    parser.add_argument("--top", type=int, default=DEFAULT_TOP_IMPORTS)
+    args = parser.parse_args()
+    sys.exit(0 if run_startup_report(args.budget, args.top) else 1)
@@ -0,0 +1,83 @@
+from collections import namedtuple
+
+import numpy as np
+
+# All-pairs walking times between stands. stand_ids maps a stand number (as in
+# the rare schedule) to its row/column in the read-only `seconds` matrix.
+WalkingModel = namedtuple("WalkingModel", ["stand_ids", "seconds"])
+
+
+def build_walking_model(stand_map):
+    """
+    Builds the all-pairs walking-time matrix from a parsed stands.json.
+
+    Stands and waypoints that share an area are joined by straight-line walks
+    (pixel distance * meters_per_pixel / walking_speed_m_per_s), each stairs
+    pair costs stairs_seconds, and shortest routes through that graph are
+    found once with Floyd-Warshall, so lookups while scoring are O(1).
+
+    Returns:
+        WalkingModel: The model, or None if no stand map was loaded.
+
+    Raises:
+        ValueError: If the map is inconsistent or any stand cannot be reached
+            from another.
+    """
+    if not stand_map:
+        return None
+    missing = [
+        key
+        for key in ("stands", "areas", "meters_per_pixel", "walking_speed_m_per_s")
+        if key not in stand_map
+    ]
+    if stand_map.get("stairs") and "stairs_seconds" not in stand_map:
+        missing.append("stairs_seconds")
+    if missing:
+        raise ValueError(f"Stand map is missing {missing}")
+
+    positions = dict(stand_map.get("waypoints", {}))
+    positions.update(stand_map["stands"])
+    node_ids = {name: i for i, name in enumerate(positions)}
+    seconds_per_pixel = stand_map["meters_per_pixel"] / stand_map["walking_speed_m_per_s"]
+
+    seconds = np.full((len(node_ids), len(node_ids)), np.inf)
+    np.fill_diagonal(seconds, 0.0)
+    for area, names in stand_map["areas"].items():
+        unknown = [name for name in names if name not in node_ids]
+        if unknown:
+            raise ValueError(f"Area '{area}' lists unknown stands/waypoints: {unknown}")
+        if len({positions[name][0] for name in names}) > 1:
+            raise ValueError(f"Area '{area}' spans several floors; join them with stairs")
+        ids = [node_ids[name] for name in names]
+        xy = np.array([positions[name][1:] for name in names], dtype=np.float64)
+        walk = np.hypot(*(xy[:, None, :] - xy[None, :, :]).transpose(2, 0, 1))
+        block = np.ix_(ids, ids)
+        seconds[block] = np.minimum(seconds[block], walk * seconds_per_pixel)
+    for lower, upper in stand_map.get("stairs", []):
+        unknown = [name for name in (lower, upper) if name not in node_ids]
+        if unknown:
+            raise ValueError(f"Stairs ({lower}, {upper}) join unknown stands/waypoints: {unknown}")
+        a, b = node_ids[lower], node_ids[upper]
+        seconds[a, b] = seconds[b, a] = min(seconds[a, b], stand_map["stairs_seconds"])
+
+    # Floyd-Warshall, one vectorized relaxation per intermediate node
+    for k in range(len(node_ids)):
+        np.minimum(seconds, seconds[:, k, None] + seconds[None, k, :], out=seconds)
+
+    stand_names = list(stand_map["stands"])
+    stand_rows = [node_ids[name] for name in stand_names]
+    stand_seconds = seconds[np.ix_(stand_rows, stand_rows)]
+    # Scoring converts to integer microseconds, where inf would wrap around to
+    # a negative walk, so every stand must be reachable from every other
+    unreachable = np.argwhere(np.isinf(stand_seconds))
+    if len(unreachable):
+        pairs = [(stand_names[a], stand_names[b]) for a, b in unreachable[:5]]
+        raise ValueError(
+            f"{len(unreachable)} stand pairs have no walking route, e.g. {pairs}; "
+            "join their areas with shared waypoints or stairs"
+        )
+    stand_seconds.flags.writeable = False
+    return WalkingModel(
+        stand_ids={name: i for i, name in enumerate(stand_names)},
+        seconds=stand_seconds,
+    )